@@ -1,5 +1,9 @@
-from src.PDF壓縮 import compress_pdf, format_size, install_ghostscript
-from src.picscan import check_tesseract, scan_image, scan_pdf
+from src.PDF壓縮 import (SHARD_MIN_BYTES, compress_pdf_batch, find_pdf_files, format_batch_summary,
+                         format_chosen_settings, format_progress, format_size, install_ghostscript,
+                         merge_and_compress)
+from src.picscan import (IMAGE_EXTENSIONS, check_tesseract, make_searchable_pdfs, scan_files,
+                         write_word_tables)
+from src.text_index import index_output, print_search_results, update_output_folders
 from src.YT.YT_NEW_transcript import YouTubeTranscriber
 from src.photo_to_word.photo_to_word import PhotoToWordApp
 from src.picsize import ImageCompressorGUI
@@ -20,16 +24,21 @@ def main():
         print("3. YouTube影片轉文字")
         print("4. 照片貼入Word")
         print("5. 圖片壓縮")
+        print("6. 搜尋文字結果")
         print("0. 退出")
 
-        choice = input("請輸入選項（0-5）：")
+        choice = input("請輸入選項（0-6）：")
 
         if choice == "0":
             break
 
         elif choice == "1":
+            # 選擇壓縮引擎，內建引擎只重新壓縮影像，不需要 Ghostscript
+            engine_choice = input("壓縮引擎（1. Ghostscript 2. 內建影像壓縮，預設 1）：").strip()
+            engine = 'pikepdf' if engine_choice == "2" else 'ghostscript'
+
             # 檢查 Ghostscript
-            if not install_ghostscript():
+            if engine == 'ghostscript' and not install_ghostscript():
                 continue
 
             # 取得桌面路徑
@@ -44,25 +53,94 @@ def main():
                 print(f"錯誤：找不到輸入資料夾: {input_folder}")
                 continue
 
-            # 執行 PDF 壓縮
-            pdf_files = list(input_folder.glob('*.pdf'))
+            # 執行 PDF 壓縮，可包含各部門的子資料夾，輸出保留相同的資料夾結構
+            recursive = input("是否包含子資料夾？(y/N)：").strip().lower() == 'y'
+            pdf_files = find_pdf_files(input_folder, recursive=recursive, exclude=output_folder)
             if not pdf_files:
                 print("PDF資料夾中沒有PDF檔案")
                 continue
 
-            for pdf_file in pdf_files:
-                input_path = str(pdf_file)
-                output_path = str(output_folder / f"compressed_{pdf_file.name}")
-                success, result, original_size, compressed_size = compress_pdf(input_path, output_path)
+            pdf_settings = '/ebook'
+            target_size = None
+            if engine == 'ghostscript':
+                # 壓縮等級，auto 會同時嘗試多種設定並保留最小的檔案
+                pdf_settings = input("壓縮等級（screen/ebook/printer/auto，預設 ebook）：").strip().lower() or 'ebook'
+                if pdf_settings not in ('screen', 'ebook', 'printer', 'auto'):
+                    print("無效的壓縮等級，改用 ebook")
+                    pdf_settings = 'ebook'
+                if pdf_settings != 'auto':
+                    pdf_settings = f'/{pdf_settings}'
+
+                # 目標大小（例如電子送件限制 5 MB）
+                target_input = input("壓縮後大小上限（MB，直接按Enter表示不限制）：").strip()
+                if target_input:
+                    try:
+                        target_size = int(float(target_input) * 1024 * 1024)
+                    except ValueError:
+                        print("大小格式錯誤，改為不限制")
 
+            # 合併模式：整個資料夾輸出成一個 PDF，重複的信頭影像與字型只存一份
+            merge_choice = input("輸出方式（1. 各別輸出 2. 合併為單一PDF，預設 1）：").strip()
+            if merge_choice == "2":
+                merged_path = output_folder / f"merged_{input_folder.name}.pdf"
+                print(f"合併 {len(pdf_files)} 個檔案...")
+                success, result, original_size, compressed_size, stats = merge_and_compress(
+                    sorted(pdf_files), merged_path, pdf_settings=pdf_settings, target_size=target_size,
+                    engine=engine)
                 if success:
+                    print(f"已合併到：{merged_path}")
+                    print(f"重複影像：{stats['images_removed']} 個，重複字型：{stats['fonts_removed']} 個")
+                    print(f"原始總大小：{format_size(original_size)}")
+                    print(f"合併壓縮後：{format_size(compressed_size)}")
+                    print(f"壓縮率：{result:.1f}%")
+                else:
+                    print(f"合併失敗：{result}")
+                continue
+
+            finished = []
+
+            def print_result(entry):
+                pdf_file, status, success, result, original_size, compressed_size, stats = entry
+                finished.append(pdf_file)
+                print(f"[{len(finished)}/{len(pdf_files)}] ", end="")
+                if status == 'cached':
+                    print(f"已壓縮過，沿用快取：{pdf_file.name}")
+                elif status == 'skipped':
+                    print(f"未壓縮：{pdf_file.name} - {result}")
+                elif success:
                     print(f"成功壓縮：{pdf_file.name}")
                     print(f"原始大小：{format_size(original_size)}")
                     print(f"壓縮後：{format_size(compressed_size)}")
                     print(f"壓縮率：{result:.1f}%")
+                    chosen = format_chosen_settings(stats)
+                    if chosen:
+                        print(f"選用設定：{chosen}")
+                elif status == 'over_budget':
+                    print(f"超過大小上限：{pdf_file.name} - {result}")
                 else:
                     print(f"壓縮失敗：{pdf_file.name} - {result}")
 
+            def print_progress(progress):
+                # 同一行更新進度，檔案完成時換行
+                print(f"\r{format_progress(progress)}", end="\n" if progress.get('done') else "", flush=True)
+
+            # 長駐模式不受 Ghostscript 的 SAFER 保護，只在使用者確認檔案都可信任時啟用
+            persistent = False
+            if engine == 'ghostscript' and not target_size and pdf_settings != 'auto':
+                print("長駐模式可加快大量小檔的壓縮，但惡意的 PDF 可以讀寫電腦上的任意檔案，"
+                      "只適合自己產生的文件，廠商收據或外來的檔案請不要使用")
+                persistent = input("檔案都來自可信任的來源，使用長駐模式？(y/N)：").strip().lower() == 'y'
+
+            # 同時執行多個壓縮工作（預設為 CPU 核心數），完成一個印一個
+            print(f"共 {len(pdf_files)} 個檔案，使用 {os.cpu_count() or 1} 個工作執行緒")
+            results = compress_pdf_batch(pdf_files, output_folder, on_result=print_result,
+                                         pdf_settings=pdf_settings, target_size=target_size,
+                                         shard_min_bytes=SHARD_MIN_BYTES, engine=engine,
+                                         input_folder=input_folder, on_progress=print_progress,
+                                         persistent=persistent)
+            print(format_batch_summary(results))
+            print(f"各檔案耗時已記錄於：{output_folder / 'compress_report.json'}")
+
         elif choice == "2":
             # 檢查 Tesseract 安裝
             if not check_tesseract():
@@ -85,26 +163,53 @@ def main():
                 print(f"錯誤: 在 {desktop_path} 中沒有找到任何文件")
                 continue
 
-            # 處理每個文件
+            # 跳過輸出文件與不支援的格式
+            file_paths = []
             for filename in files:
                 if filename.startswith('output_'):
                     continue
-
-                file_path = os.path.join(desktop_path, filename)
-                print(f"\n開始處理: {filename}")
-
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
-                    result = scan_image(file_path)
-                elif filename.lower().endswith('.pdf'):
-                    result = scan_pdf(file_path)
-                else:
+                if not filename.lower().endswith(IMAGE_EXTENSIONS + ('.pdf',)):
                     print(f"不支援的文件格式: {filename}")
                     continue
+                file_paths.append(os.path.join(desktop_path, filename))
+
+            # 輸出格式：文字檔、保留原始影像並加上文字層的可搜尋 PDF，或含位置與信心度的逐字表
+            format_choice = input("輸出格式（1. 文字檔 2. 可搜尋PDF 3. 逐字位置表 Parquet，預設 1）：").strip()
+            if format_choice in ("2", "3"):
+                print(f"\n開始處理 {len(file_paths)} 個文件...")
+                if format_choice == "2":
+                    results = make_searchable_pdfs(file_paths, desktop_path)
+                else:
+                    results = write_word_tables(file_paths, desktop_path)
+                for file_path, success, result in results:
+                    filename = os.path.basename(file_path)
+                    if success:
+                        print(f"處理完成: {filename}")
+                        print(f"結果已保存到: {result}")
+                    else:
+                        print(f"處理失敗: {filename} - {result}")
+                continue
+
+            # 手機照片或灰暗的掃描檔可先做影像前處理
+            preprocess = input("是否先做影像前處理（灰階、二值化、校正傾斜）？(y/N)：").strip().lower() == 'y'
+
+            # 兩段式辨識：乾淨的頁面走快速路徑，難辨識的頁面才以高解析度重新辨識
+            adaptive = input("是否使用兩段式辨識（先快速辨識，信心度低的部分再以高解析度重新辨識）？(y/N)："
+                             ).strip().lower() == 'y'
+
+            # 版面分析：圖片中有照片、印章或大片留白時，只辨識文字區塊
+            layout = input("圖片是否依版面分區辨識（略過照片與空白，支援直書）？(y/N)：").strip().lower() == 'y'
+
+            # 多個文件分給多個行程同時處理，完成一個存一個
+            print(f"\n開始處理 {len(file_paths)} 個文件...")
+            for file_path, result in scan_files(file_paths, preprocess=preprocess, adaptive=adaptive, layout=layout):
+                filename = os.path.basename(file_path)
 
                 # 儲存結果
                 output_file = os.path.join(desktop_path, f"output_{os.path.splitext(filename)[0]}.txt")
                 with open(output_file, 'w', encoding='utf-8') as f:
                     f.write(result)
+                index_output(output_file)
                 print(f"處理完成: {filename}")
                 print(f"結果已保存到: {output_file}")
 
@@ -131,6 +236,16 @@ def main():
                 print(f"圖片壓縮功能發生錯誤: {str(e)}")
                 messagebox.showerror("錯誤", f"執行時發生錯誤: {str(e)}")
 
+        elif choice == "6":
+            # 各工具寫出結果時已更新索引；只有手動放入或修改過輸出檔時才需要重新掃描
+            query = input("請輸入要搜尋的文字：").strip()
+            if not query:
+                continue
+            if input("是否先重新掃描輸出資料夾？(y/N)：").strip().lower() == 'y':
+                indexed, removed = update_output_folders()
+                print(f"索引已更新：{indexed} 個檔案重新索引，{removed} 個檔案已移除")
+            print_search_results(query)
+
         else:
             print("無效的選項，請重新選擇")
 
@@ -4,13 +4,63 @@ from tkinter import messagebox
 from pathlib import Path
 import subprocess
 import sys
+import json
+import hashlib
+import mmap
+import re
+import shutil
+import tempfile
+import time
+import threading
+from collections import deque
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+
+def find_ghostscript():
+    """尋找 Ghostscript 執行檔，Windows 為 gswin64c/gswin32c，Linux 與 macOS 為 gs"""
+    for name in ('gswin64c', 'gswin32c', 'gs'):
+        if shutil.which(name):
+            return name
+    return 'gswin64c'
+
+
+GS_COMMAND = find_ghostscript()
+
+# 目標大小模式依序嘗試的 (影像解析度 DPI, JPEG 品質)，由高畫質到低畫質
+TARGET_SIZE_LADDER = [
+    (300, 85), (200, 80), (150, 75), (150, 60), (120, 60),
+    (100, 50), (85, 40), (72, 35), (72, 20),
+]
+
+# 自動模式同時嘗試的設定，dpi 為輸出影像的解析度，用來排除低於最低 DPI 的設定
+AUTO_PRESETS = [
+    {'name': 'screen', 'pdf_settings': '/screen', 'dpi': 72},
+    {'name': 'ebook', 'pdf_settings': '/ebook', 'dpi': 150},
+    {'name': 'printer', 'pdf_settings': '/printer', 'dpi': 300},
+    {'name': 'ebook-120', 'pdf_settings': '/ebook', 'resolution': 120, 'jpeg_quality': 60, 'dpi': 120},
+    {'name': 'printer-200', 'pdf_settings': '/printer', 'resolution': 200, 'jpeg_quality': 75, 'dpi': 200},
+]
+
+# 分段模式：超過門檻的大檔案切成每段 SHARD_PAGES 頁，各段同時壓縮後再合併
+SHARD_PAGES = 100
+SHARD_MIN_BYTES = 100 * 1024 * 1024
+
+# 各 PDFSETTINGS 預設的影像解析度，用來預估壓縮效果
+PDF_SETTINGS_DPI = {'/screen': 72, '/ebook': 150, '/printer': 300, '/prepress': 300}
+
+# 預估可減少的比例低於此值時，批次壓縮直接複製原檔
+MIN_PREDICTED_GAIN = 0.05
+
+# 長駐 Ghostscript 模式只處理小於此大小的檔案，大檔案仍用獨立行程以便回報逐頁進度
+PERSISTENT_MAX_BYTES = 5 * 1024 * 1024
 
 
 def install_ghostscript():
     """檢查是否安裝了 Ghostscript"""
     try:
-        # 嘗試執行 gswin64c.exe
-        subprocess.run(['gswin64c', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # 嘗試執行 Ghostscript
+        subprocess.run([GS_COMMAND, '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
         return True
     except FileNotFoundError:
         messagebox.showerror("錯誤", "請先安裝 Ghostscript:\n"
@@ -20,39 +70,852 @@ def install_ghostscript():
         return False
 
 
-def compress_pdf(input_path, output_path):
+def _jpeg_qfactor(jpeg_quality):
+    """將 JPEG 品質（1-100）換算為 Ghostscript DCTEncode 的 QFactor（與 libjpeg 相同的對應）"""
+    jpeg_quality = min(max(int(jpeg_quality), 1), 100)
+    scale = 5000 / jpeg_quality if jpeg_quality < 50 else 200 - 2 * jpeg_quality
+    return round(scale / 100, 3)
+
+
+def ghostscript_options(pdf_settings='/ebook', resolution=None, jpeg_quality=None):
+    """
+    回傳壓縮用的 Ghostscript 參數（不含輸入與輸出路徑）
+
+    resolution 指定影像降採樣的目標 DPI，jpeg_quality 指定影像重新編碼的 JPEG 品質，
+    未指定時沿用 pdf_settings 預設值。
+    批次快取也以這組參數作為設定的識別，參數改變時舊的壓縮結果就不會被沿用。
+    """
+    options = [
+        '-sDEVICE=pdfwrite',
+        '-dCompatibilityLevel=1.4',
+        f'-dPDFSETTINGS={pdf_settings}',  # 可選: /screen, /ebook, /printer, /prepress
+        '-dNOPAUSE',
+        '-dQUIET',
+        '-dBATCH',
+    ]
+
+    if resolution:
+        options += [
+            '-dDownsampleColorImages=true',
+            '-dDownsampleGrayImages=true',
+            '-dDownsampleMonoImages=true',
+            '-dColorImageDownsampleType=/Bicubic',
+            '-dGrayImageDownsampleType=/Bicubic',
+            '-dColorImageDownsampleThreshold=1.0',
+            '-dGrayImageDownsampleThreshold=1.0',
+            f'-dColorImageResolution={resolution}',
+            f'-dGrayImageResolution={resolution}',
+            # 黑白影像（掃描文字）保留較高解析度，否則字會糊掉
+            f'-dMonoImageResolution={max(resolution * 2, 300)}',
+        ]
+
+    if jpeg_quality:
+        qfactor = _jpeg_qfactor(jpeg_quality)
+        image_dict = f'<< /QFactor {qfactor} /Blend 1 /HSamples [2 1 1 2] /VSamples [2 1 1 2] >>'
+        options += [
+            '-c',
+            f'<< /AutoFilterColorImages false /AutoFilterGrayImages false '
+            f'/ColorImageFilter /DCTEncode /GrayImageFilter /DCTEncode '
+            f'/ColorImageDict {image_dict} /GrayImageDict {image_dict} >> setdistillerparams',
+        ]
+
+    return options
+
+
+def build_gs_command(input_path, output_path, options, first_page=None, last_page=None, page_list=None):
+    """組合完整的 Ghostscript 命令，可只處理部分頁面"""
+    page_options = []
+    if first_page:
+        page_options.append(f'-dFirstPage={first_page}')
+    if last_page:
+        page_options.append(f'-dLastPage={last_page}')
+    if page_list:
+        page_options.append(f"-sPageList={','.join(str(page) for page in page_list)}")
+
+    # -sOutputFile 必須放在 -c 之前，-f 之後才是輸入檔
+    return [GS_COMMAND, f'-sOutputFile={output_path}', *page_options, *options, '-f', str(input_path)]
+
+
+def get_pdf_page_count(input_path):
+    """使用 Ghostscript 取得 PDF 頁數，失敗時回傳 None"""
+    # 路徑以十六進位字串傳入 PostScript，避免反斜線、括號與中文檔名的跳脫問題
+    path_hex = str(input_path).encode('utf-8').hex()
+    gs_command = [
+        GS_COMMAND, '-q', '-dNODISPLAY', '-dBATCH', '-dNOPAUSE',
+        f'--permit-file-read={input_path}',
+        '-c', f'<{path_hex}> (r) file runpdfbegin pdfpagecount = quit',
+    ]
+    try:
+        result = subprocess.run(gs_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return int(result.stdout.decode().strip().splitlines()[-1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _ps_string(text):
+    """轉成 PostScript 十六進位字串，避免路徑中的反斜線、括號與中文需要跳脫"""
+    return '<' + str(text).encode('utf-8').hex() + '>'
+
+
+class GhostscriptSession:
+    """
+    長駐的 Ghostscript 直譯器，一個行程依序壓縮多個檔案
+
+    每個檔案另開行程都要重新啟動並載入字型，處理大量單頁收據時這段時間比壓縮本身還久。
+    這裡以標準輸入送出 PostScript：用 setpagedevice 切換 /OutputFile 到目標檔，
+    執行輸入的 PDF，再切回空裝置讓 pdfwrite 寫完檔案，最後印出標記表示完成。
+
+    -dSAFER 會鎖住裝置參數（.LockSafetyParams），之後無法再變更 /OutputFile，
+    --permit-file-write 也解不開，因此長駐直譯器必須以 -dNOSAFER 執行。
+    代價是直譯器不再限制檔案存取，惡意的 PDF 可以讀寫任意檔案；
+    只適合壓縮自己的文件，來源不明的檔案請不要使用長駐模式
+    （一般模式每個檔案另開行程，維持 Ghostscript 預設的 SAFER）。
+    """
+
+    DONE = '%%PICCOMPRESS_DONE%%'
+    FAILED = '%%PICCOMPRESS_FAILED%%'
+
+    def __init__(self, options, max_jobs=200):
+        # -c 之後的 PostScript（例如 setdistillerparams）在啟動後由標準輸入送出
+        if '-c' in options:
+            split = options.index('-c')
+            switches, self.postscript = options[:split], ' '.join(options[split + 1:])
+        else:
+            switches, self.postscript = options, ''
+
+        self.command = [
+            GS_COMMAND, '-q', '-dNOSAFER', '-dNOPROMPT',
+            *(switch for switch in switches if switch not in ('-dBATCH', '-dQUIET')),
+            f'-sOutputFile={os.devnull}', '-',
+        ]
+        self.max_jobs = max_jobs
+        self.process = None
+        self.jobs = 0
+        self.errors = deque(maxlen=50)
+
+    def _start(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE)
+        self.jobs = 0
+        # 持續讀取錯誤輸出，避免緩衝區滿了卡住 Ghostscript
+        threading.Thread(target=self._drain_errors, args=(self.process,), daemon=True).start()
+        if self.postscript:
+            self._send(self.postscript)
+
+    def _drain_errors(self, process):
+        for raw_line in process.stderr:
+            self.errors.append(raw_line.decode(errors='replace').rstrip())
+
+    def _send(self, postscript):
+        self.process.stdin.write(postscript.encode('utf-8') + b'\n')
+        self.process.stdin.flush()
+
+    def compress(self, input_path, output_path):
+        """壓縮一個檔案，回傳 (returncode, error)"""
+        # 定期重新啟動，避免直譯器記憶體持續累積
+        if self.process is None or self.process.poll() is not None or self.jobs >= self.max_jobs:
+            self.close()
+            self._start()
+
+        self.errors.clear()
+        self.jobs += 1
+        self._send(
+            f"{{ << /OutputFile {_ps_string(output_path)} >> setpagedevice {_ps_string(input_path)} run "
+            f"<< /OutputFile {_ps_string(os.devnull)} >> setpagedevice }} stopped "
+            f"{{ clear ({self.FAILED}\\n) }} {{ ({self.DONE}\\n) }} ifelse print flush"
+        )
+
+        for raw_line in self.process.stdout:
+            line = raw_line.decode(errors='replace').strip()
+            if line == self.DONE:
+                if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+                    return 1, "Ghostscript 沒有寫出輸出檔"
+                return 0, ''
+            if line == self.FAILED:
+                # 失敗後直譯器狀態不可靠，下一個檔案重新啟動
+                self.close()
+                return 1, '\n'.join(self.errors) or "Ghostscript 執行失敗"
+
+        self.close()
+        return 1, '\n'.join(self.errors) or "Ghostscript 意外結束"
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self._send('quit')
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+
+class GhostscriptPool:
+    """讓批次的每個工作執行緒各自擁有一個 GhostscriptSession"""
+
+    def __init__(self, options):
+        self.options = options
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def compress(self, input_path, output_path):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = GhostscriptSession(self.options)
+            self.local.session = session
+            with self.lock:
+                self.sessions.append(session)
+        return session.compress(input_path, output_path)
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions:
+                session.close()
+            self.sessions.clear()
+
+
+_PAGES_RE = re.compile(r'Processing pages (\d+) through (\d+)')
+_PAGE_RE = re.compile(r'^Page (\d+)')
+
+
+def run_ghostscript_with_progress(gs_command, on_progress, input_path=None):
+    """
+    執行 Ghostscript 並逐行讀取輸出，回報目前頁數、速度與預估剩餘時間
+
+    會移除 -dQUIET 讓 Ghostscript 印出 "Page N"。每開始處理一頁就以
+    {'file', 'page', 'total_pages', 'pages_per_second', 'eta'} 呼叫 on_progress；
+    結束時再呼叫一次，並附上 'done': True、'elapsed' 與每頁耗時 'page_times'。
+    回傳 (returncode, output)，output 為 Ghostscript 的完整輸出文字。
+    """
+    gs_command = [arg for arg in gs_command if arg != '-dQUIET']
+    process = subprocess.Popen(gs_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+    start = time.perf_counter()
+    output = []
+    page_times = []
+    first_page = total_pages = None
+    pages_done = 0
+    page_started = None
+
+    def progress(page, done=False):
+        elapsed = time.perf_counter() - start
+        pages_per_second = pages_done / elapsed if elapsed > 0 else 0.0
+        remaining = (total_pages - pages_done) if total_pages else None
+        eta = remaining / pages_per_second if remaining is not None and pages_per_second else None
+        info = {'file': input_path, 'page': page, 'total_pages': total_pages,
+                'pages_per_second': pages_per_second, 'eta': eta}
+        if done:
+            info.update(done=True, elapsed=elapsed, page_times=page_times)
+        on_progress(info)
+
+    for raw_line in process.stdout:
+        line = raw_line.decode(errors='replace').rstrip()
+        output.append(line)
+
+        match = _PAGES_RE.search(line)
+        if match:
+            first_page = int(match.group(1))
+            total_pages = int(match.group(2)) - first_page + 1
+            continue
+
+        match = _PAGE_RE.match(line)
+        if match:
+            now = time.perf_counter()
+            if page_started is not None:
+                page_times.append(round(now - page_started, 4))
+                pages_done += 1
+            page_started = now
+            progress(int(match.group(1)))
+
+    returncode = process.wait()
+    if page_started is not None:
+        page_times.append(round(time.perf_counter() - page_started, 4))
+        pages_done += 1
+    progress(pages_done + (first_page or 1) - 1, done=True)
+    return returncode, '\n'.join(output)
+
+
+def format_progress(progress):
+    """將進度資訊整理成一行文字，供命令列與視窗顯示"""
+    name = Path(progress['file']).name if progress.get('file') else ''
+    if progress.get('done'):
+        return f"{name}: 完成 {len(progress['page_times'])} 頁，耗時 {progress['elapsed']:.1f} 秒"
+    text = f"{name}: 第 {progress['page']}"
+    if progress['total_pages']:
+        text += f"/{progress['total_pages']}"
+    text += f" 頁，{progress['pages_per_second']:.2f} 頁/秒"
+    if progress['eta'] is not None:
+        text += f"，預估剩餘 {progress['eta']:.0f} 秒"
+    return text
+
+
+def compress_pdf(input_path, output_path, pdf_settings='/ebook', resolution=None, jpeg_quality=None,
+                 target_size=None, min_dpi=150, shard_min_pages=None, shard_min_bytes=None,
+                 shard_workers=None, engine='ghostscript', on_progress=None, session=None, stats=None):
     """
     使用 Ghostscript 壓縮 PDF
+
+    指定 on_progress 時逐頁回報進度，詳見 run_ghostscript_with_progress（只適用一般模式）。
+    指定 session（GhostscriptSession 或 GhostscriptPool）時改由長駐的直譯器壓縮，
+    session 必須以相同的 ghostscript_options 建立，此時不回報逐頁進度；
+    長駐直譯器失敗時自動改用一般模式（每個檔案另開 Ghostscript）重試。
+    engine 為 'pikepdf' 時不使用 Ghostscript，只在程式內重新壓縮內嵌影像，詳見 compress_pdf_images。
+    指定 target_size（位元組）時改用目標大小模式，詳見 compress_pdf_to_size；
+    pdf_settings 為 'auto' 時同時嘗試多組設定並保留最小的結果，詳見 compress_pdf_auto；
+    檔案頁數達 shard_min_pages 或大小達 shard_min_bytes 時改用分段模式，詳見 compress_pdf_sharded，
+    shard_workers 為同時壓縮的段數（預設為 CPU 核心數）。
+    指定 stats（字典）時，目標大小模式選用的 {'resolution', 'jpeg_quality'} 存入 stats['settings']，
+    自動模式選用的設定名稱存入 stats['preset']。
     """
+    if engine == 'pikepdf':
+        return compress_pdf_images(input_path, output_path, jpeg_quality or 70)
+    if target_size:
+        success, result, original_size, compressed_size, settings = compress_pdf_to_size(
+            input_path, output_path, target_size)
+        if settings and stats is not None:
+            stats['settings'] = settings
+        return success, result, original_size, compressed_size
+    if pdf_settings == 'auto':
+        success, result, original_size, compressed_size, preset_name = compress_pdf_auto(
+            input_path, output_path, min_dpi)
+        if preset_name and stats is not None:
+            stats['preset'] = preset_name
+        return success, result, original_size, compressed_size
+    if should_shard(input_path, shard_min_pages, shard_min_bytes):
+        return compress_pdf_sharded(input_path, output_path, max_workers=shard_workers,
+                                    pdf_settings=pdf_settings, resolution=resolution, jpeg_quality=jpeg_quality)
+
     try:
         # Ghostscript 命令
-        gs_command = [
-            'gswin64c',
-            '-sDEVICE=pdfwrite',
-            '-dCompatibilityLevel=1.4',
-            '-dPDFSETTINGS=/ebook',  # 可選: /screen, /ebook, /printer, /prepress
-            '-dNOPAUSE',
-            '-dQUIET',
-            '-dBATCH',
-            f'-sOutputFile={output_path}',
-            input_path
-        ]
+        options = ghostscript_options(pdf_settings, resolution, jpeg_quality)
+        gs_command = build_gs_command(input_path, output_path, options)
 
         # 執行命令
-        result = subprocess.run(gs_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        returncode = None
+        if session:
+            # 先刪除舊的輸出，避免把上次的結果當成這次的輸出
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            returncode, error = session.compress(input_path, output_path)
+            if returncode != 0:
+                # 長駐直譯器的問題不應讓檔案失敗，改用一般模式重試
+                returncode = None
 
-        if result.returncode == 0:
+        if returncode is None and on_progress:
+            returncode, error = run_ghostscript_with_progress(gs_command, on_progress, input_path)
+        elif returncode is None:
+            result = subprocess.run(gs_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            returncode, error = result.returncode, result.stderr.decode()
+
+        if returncode == 0:
             original_size = os.path.getsize(input_path)
             compressed_size = os.path.getsize(output_path)
             compression_ratio = (1 - compressed_size / original_size) * 100
             return True, compression_ratio, original_size, compressed_size
         else:
-            return False, f"Ghostscript 錯誤: {result.stderr.decode()}", 0, 0
+            return False, f"Ghostscript 錯誤: {error}", 0, 0
+
+    except Exception as e:
+        return False, str(e), 0, 0
+
+
+def _image_masks(pdf):
+    """收集作為透明遮罩（SMask）使用的影像，這些影像不重新壓縮"""
+    import pikepdf
+
+    masks = set()
+    for obj in pdf.objects:
+        if isinstance(obj, pikepdf.Stream) and '/SMask' in obj:
+            masks.add(obj.SMask.objgen)
+    return masks
+
+
+def compress_pdf_images(input_path, output_path, jpeg_quality=70):
+    """
+    不經 Ghostscript，直接在程式內重新壓縮 PDF 中的點陣影像
+
+    使用 pikepdf 開啟 PDF，逐一以與圖片壓縮工具相同的 Pillow 設定把影像重新存成 JPEG，
+    只有變小時才替換；文字與向量內容完全不動，也不必重新繪製整份文件。
+    黑白影像、遮罩與帶 /Decode 的影像會略過，避免失真。
+    """
+    try:
+        import pikepdf
+        from pikepdf import Name, PdfImage
+    except ImportError:
+        return False, "內建壓縮需要 pikepdf，請先執行: pip install pikepdf", 0, 0
+
+    from src.picsize import save_compressed_image
+
+    try:
+        original_size = os.path.getsize(input_path)
+
+        with pikepdf.open(input_path) as pdf:
+            masks = _image_masks(pdf)
+
+            for obj in pdf.objects:
+                if not isinstance(obj, pikepdf.Stream) or obj.get('/Subtype') != Name.Image:
+                    continue
+                if obj.objgen in masks or obj.get('/ImageMask', False) or '/Decode' in obj:
+                    continue
+                if obj.get('/BitsPerComponent', 8) < 8:
+                    continue
+
+                try:
+                    image = PdfImage(obj).as_pil_image()
+                except Exception:
+                    # 不支援的色彩空間或編碼，保留原樣
+                    continue
+
+                if image.mode not in ('L', 'RGB'):
+                    image = image.convert('RGB')
+
+                buffer = BytesIO()
+                save_compressed_image(image, buffer, jpeg_quality, format='JPEG')
+                data = buffer.getvalue()
+                if len(data) >= len(obj.read_raw_bytes()):
+                    continue
+
+                obj.write(data, filter=Name.DCTDecode)
+                obj.ColorSpace = Name.DeviceGray if image.mode == 'L' else Name.DeviceRGB
+                obj.BitsPerComponent = 8
+
+            pdf.save(output_path, compress_streams=True,
+                     object_stream_mode=pikepdf.ObjectStreamMode.generate)
+
+        compressed_size = os.path.getsize(output_path)
+        compression_ratio = (1 - compressed_size / original_size) * 100
+        return True, compression_ratio, original_size, compressed_size
+
+    except Exception as e:
+        return False, str(e), 0, 0
+
+
+def _sample_pages(page_count, sample_pages):
+    """在整份文件中平均挑選取樣頁面"""
+    if page_count <= sample_pages:
+        return list(range(1, page_count + 1))
+    step = page_count / sample_pages
+    return sorted({int(i * step) + 1 for i in range(sample_pages)})
+
+
+def compress_pdf_to_size(input_path, output_path, target_size, sample_pages=5, ladder=TARGET_SIZE_LADDER):
+    """
+    壓縮 PDF 到 target_size（位元組）以下，並盡量保留畫質
+
+    先只壓縮少數取樣頁面來估計整份檔案的大小，以二分搜尋在 ladder 中找出
+    預估大小符合目標的最高畫質設定，再做一次完整壓縮；完整結果仍超過目標時，
+    依序改用下一級設定。
+    回傳 (success, result, original_size, compressed_size, settings)，
+    settings 為選用的 {'resolution', 'jpeg_quality'}。
+    最低畫質仍超過目標時，最小的結果仍會寫到 output_path，此時 success 為 False，
+    compressed_size 與 settings 為該結果的大小與設定（Ghostscript 錯誤時兩者為 0 與 None）。
+    """
+    try:
+        original_size = os.path.getsize(input_path)
+        page_count = get_pdf_page_count(input_path)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            start = 0
+            # 頁數少的檔案取樣和完整壓縮差不多，直接從完整壓縮開始
+            if page_count and page_count > sample_pages * 2:
+                pages = _sample_pages(page_count, sample_pages)
+                probe_path = os.path.join(temp_dir, 'probe.pdf')
+
+                def estimate(step):
+                    resolution, jpeg_quality = ladder[step]
+                    options = ghostscript_options(resolution=resolution, jpeg_quality=jpeg_quality)
+                    result = subprocess.run(build_gs_command(input_path, probe_path, options, page_list=pages),
+                                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                    if result.returncode != 0:
+                        return None
+                    return os.path.getsize(probe_path) / len(pages) * page_count
+
+                # 二分搜尋第一個預估大小在目標內的設定（保留 10% 的估計誤差）
+                low, high = 0, len(ladder) - 1
+                while low < high:
+                    middle = (low + high) // 2
+                    estimated = estimate(middle)
+                    if estimated is not None and estimated <= target_size * 0.9:
+                        high = middle
+                    else:
+                        low = middle + 1
+                start = low
+
+            best_path = os.path.join(temp_dir, 'best.pdf')
+            best_size = None
+            best_settings = None
+            for step in range(start, len(ladder)):
+                resolution, jpeg_quality = ladder[step]
+                attempt_path = os.path.join(temp_dir, f'attempt_{step}.pdf')
+                options = ghostscript_options(resolution=resolution, jpeg_quality=jpeg_quality)
+                result = subprocess.run(build_gs_command(input_path, attempt_path, options),
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                if result.returncode != 0:
+                    return False, f"Ghostscript 錯誤: {result.stderr.decode()}", 0, 0, None
+
+                attempt_size = os.path.getsize(attempt_path)
+                settings = {'resolution': resolution, 'jpeg_quality': jpeg_quality}
+                if best_size is None or attempt_size < best_size:
+                    os.replace(attempt_path, best_path)
+                    best_size, best_settings = attempt_size, settings
+
+                if attempt_size <= target_size:
+                    shutil.move(best_path, output_path)
+                    compression_ratio = (1 - attempt_size / original_size) * 100
+                    return True, compression_ratio, original_size, attempt_size, settings
+
+            # 最低畫質仍超過目標時，仍輸出最小的結果，由呼叫端決定是否採用
+            shutil.move(best_path, output_path)
+            return (False, f"最低畫質仍無法壓縮到 {format_size(target_size)} 以下"
+                           f"（最小 {format_size(best_size)}）", original_size, best_size, best_settings)
+
+    except Exception as e:
+        return False, str(e), 0, 0, None
+
+
+def auto_presets(min_dpi, presets=AUTO_PRESETS):
+    """回傳輸出解析度不低於 min_dpi 的自動模式候選設定"""
+    return [preset for preset in presets if preset['dpi'] >= min_dpi]
+
+
+def compress_pdf_auto(input_path, output_path, min_dpi=150, presets=AUTO_PRESETS, max_workers=None):
+    """
+    同時以多組設定壓縮 PDF，保留最小的結果
+
+    只使用輸出解析度不低於 min_dpi 的設定，各設定以獨立的 Ghostscript 行程
+    同時輸出到暫存檔，完成後把最小的檔案移到 output_path。
+    回傳 (success, result, original_size, compressed_size, preset_name)。
+    """
+    candidates = auto_presets(min_dpi, presets)
+    if not candidates:
+        return False, f"沒有輸出解析度達到 {min_dpi} DPI 的設定", 0, 0, None
+
+    try:
+        original_size = os.path.getsize(input_path)
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+
+        # 暫存檔放在輸出資料夾，最後只需改名
+        with tempfile.TemporaryDirectory(dir=output_dir) as temp_dir:
+            def run_preset(preset):
+                attempt_path = os.path.join(temp_dir, f"{preset['name']}.pdf")
+                options = ghostscript_options(preset['pdf_settings'], preset.get('resolution'),
+                                              preset.get('jpeg_quality'))
+                result = subprocess.run(build_gs_command(input_path, attempt_path, options),
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                if result.returncode != 0:
+                    return preset, None, result.stderr.decode()
+                return preset, attempt_path, None
+
+            with ThreadPoolExecutor(max_workers=max_workers or len(candidates)) as executor:
+                attempts = list(executor.map(run_preset, candidates))
+
+            finished = [(os.path.getsize(path), preset, path) for preset, path, _ in attempts if path]
+            if not finished:
+                return False, f"Ghostscript 錯誤: {attempts[0][2]}", 0, 0, None
+
+            compressed_size, preset, best_path = min(finished, key=lambda attempt: attempt[0])
+            os.replace(best_path, output_path)
+            compression_ratio = (1 - compressed_size / original_size) * 100
+            return True, compression_ratio, original_size, compressed_size, preset['name']
+
+    except Exception as e:
+        return False, str(e), 0, 0, None
+
+
+def should_shard(input_path, shard_min_pages=None, shard_min_bytes=None):
+    """判斷檔案是否超過分段壓縮的頁數或大小門檻"""
+    if shard_min_bytes and os.path.getsize(input_path) >= shard_min_bytes:
+        return True
+    if shard_min_pages:
+        page_count = get_pdf_page_count(input_path)
+        return page_count is not None and page_count >= shard_min_pages
+    return False
+
+
+def _copy_outline(reader, outline, writer, parent=None):
+    """將原始檔的書籤（含階層）依頁碼複製到合併後的檔案"""
+    last_item = None
+    for item in outline:
+        # 子書籤以列表形式緊接在父書籤之後
+        if isinstance(item, list):
+            _copy_outline(reader, item, writer, last_item or parent)
+            continue
+
+        page_number = reader.get_destination_page_number(item)
+        if page_number is None or page_number < 0:
+            last_item = None
+            continue
+        last_item = writer.add_outline_item(item.title, page_number, parent=parent)
+
+
+def merge_shards(input_path, shard_paths, output_path):
+    """依序合併分段壓縮的結果，並保留原始檔的書籤與文件資訊"""
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for shard_path in shard_paths:
+        writer.append(shard_path, import_outline=False)
+
+    original = PdfReader(input_path)
+    if original.metadata:
+        writer.add_metadata({key: value for key, value in original.metadata.items()})
+    _copy_outline(original, original.outline, writer)
+
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+
+
+def compress_pdf_sharded(input_path, output_path, shard_pages=SHARD_PAGES, max_workers=None,
+                         pdf_settings='/ebook', resolution=None, jpeg_quality=None):
+    """
+    將大型 PDF 依頁碼範圍切段，同時壓縮各段後再合併成一個檔案
+
+    單一 Ghostscript 行程只會用到一個核心，切段後各段以 -dFirstPage/-dLastPage
+    分別壓縮。合併需要 pypdf，書籤與文件資訊從原始檔複製。
+    各段會各自嵌入用到的字型，因此結果可能比單一行程略大。
+    """
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        return False, "分段壓縮需要 pypdf，請先執行: pip install pypdf", 0, 0
+
+    try:
+        original_size = os.path.getsize(input_path)
+        page_count = get_pdf_page_count(input_path)
+        if not page_count:
+            return False, "無法取得 PDF 頁數", 0, 0
+
+        ranges = [(first, min(first + shard_pages - 1, page_count))
+                  for first in range(1, page_count + 1, shard_pages)]
+        options = ghostscript_options(pdf_settings, resolution, jpeg_quality)
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+
+        with tempfile.TemporaryDirectory(dir=output_dir) as temp_dir:
+            def run_shard(index):
+                first_page, last_page = ranges[index]
+                shard_path = os.path.join(temp_dir, f'shard_{index:05d}.pdf')
+                result = subprocess.run(
+                    build_gs_command(input_path, shard_path, options, first_page=first_page, last_page=last_page),
+                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                if result.returncode != 0:
+                    raise RuntimeError(f"第 {first_page}-{last_page} 頁 Ghostscript 錯誤: {result.stderr.decode()}")
+                return shard_path
+
+            with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as executor:
+                shard_paths = list(executor.map(run_shard, range(len(ranges))))
+
+            merge_shards(input_path, shard_paths, output_path)
+
+        compressed_size = os.path.getsize(output_path)
+        compression_ratio = (1 - compressed_size / original_size) * 100
+        return True, compression_ratio, original_size, compressed_size
 
     except Exception as e:
         return False, str(e), 0, 0
 
 
+# 串流關鍵字前面必須是字典結尾的 >>，否則 endstream 也會被當成串流開頭
+_STREAM_RE = re.compile(rb'>>\s*stream\r?\n')
+_OBJ_RE = re.compile(rb'\d+\s+\d+\s+obj\b')
+_MEDIABOX_RE = re.compile(rb'/MediaBox\s*\[\s*([-\d.]+)\s+([-\d.]+)\s+([-\d.]+)\s+([-\d.]+)\s*\]')
+
+
+def _dict_int(dictionary, key):
+    """從原始字典內容取出整數欄位（間接參照無法解析時回傳 0）"""
+    match = re.search(rb'/' + key + rb'\s+(\d+)(?!\s+\d+\s+R)', dictionary)
+    return int(match.group(1)) if match else 0
+
+
+def analyze_pdf(input_path, target_dpi=150):
+    """
+    快速掃描 PDF 物件，預估壓縮能減少的比例
+
+    不解析整份文件，只掃描原始位元組中的串流物件：影像一定是獨立的串流物件，
+    因此可直接從字典判斷影像的寬高與編碼，並以串流長度計算影像占檔案的比例。
+    影像解析度以「影像填滿頁面」估算，適用於掃描檔。
+    回傳 {'file_size', 'image_count', 'image_bytes', 'image_fraction', 'max_dpi', 'predicted_gain'}。
+    """
+    file_size = os.path.getsize(input_path)
+    analysis = {'file_size': file_size, 'image_count': 0, 'image_bytes': 0,
+                'image_fraction': 0.0, 'max_dpi': 0, 'predicted_gain': 0.0}
+    if file_size == 0:
+        return analysis
+
+    with open(input_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # 以最大的頁面尺寸（點，1/72 英吋）作為影像實際大小的估計
+        page_width, page_height = 612.0, 792.0
+        boxes = [tuple(float(v) for v in match.groups()) for match in _MEDIABOX_RE.finditer(data)]
+        if boxes:
+            page_width = max(abs(box[2] - box[0]) for box in boxes) or page_width
+            page_height = max(abs(box[3] - box[1]) for box in boxes) or page_height
+
+        saved_bytes = 0.0
+        for match in _STREAM_RE.finditer(data):
+            # 串流前方最近的 "n 0 obj" 到 stream 之間就是該物件的字典
+            head_start = max(0, match.start() - 4096)
+            head = data[head_start:match.start()]
+            objects = list(_OBJ_RE.finditer(head))
+            if not objects:
+                continue
+            dictionary = head[objects[-1].end():]
+            if not re.search(rb'/Subtype\s*/Image', dictionary):
+                continue
+
+            end = data.find(b'endstream', match.end())
+            if end < 0:
+                continue
+            length = end - match.end()
+            width, height = _dict_int(dictionary, rb'Width'), _dict_int(dictionary, rb'Height')
+            dpi = max(width / (page_width / 72), height / (page_height / 72))
+
+            analysis['image_count'] += 1
+            analysis['image_bytes'] += length
+            analysis['max_dpi'] = max(analysis['max_dpi'], int(dpi))
+
+            if target_dpi and dpi > target_dpi * 1.1:
+                # 降採樣後像素數依解析度平方減少
+                gain = 1 - (target_dpi / dpi) ** 2
+            elif b'/DCTDecode' in dictionary or b'/JPXDecode' in dictionary:
+                # 已經是 JPEG，重新編碼的效果有限
+                gain = 0.1
+            else:
+                gain = 0.5
+            saved_bytes += length * gain
+
+    analysis['image_fraction'] = analysis['image_bytes'] / file_size
+    analysis['predicted_gain'] = saved_bytes / file_size
+    return analysis
+
+
+def expected_dpi(pdf_settings='/ebook', resolution=None, min_dpi=150, engine='ghostscript', **_):
+    """依壓縮設定推算輸出影像的解析度，內建引擎不降採樣時回傳 None"""
+    if engine == 'pikepdf':
+        return None
+    if resolution:
+        return resolution
+    if pdf_settings == 'auto':
+        return min((preset['dpi'] for preset in auto_presets(min_dpi)), default=min_dpi)
+    return PDF_SETTINGS_DPI.get(pdf_settings, 150)
+
+
+def partial_output_path(output_path):
+    """回傳寫入中的暫存檔路徑，與輸出檔在同一資料夾，完成後改名即可"""
+    output_path = Path(output_path)
+    return output_path.with_name(f".{output_path.name}.part")
+
+
+def copy_atomic(source_path, output_path):
+    """先複製到暫存檔再改名，中斷時不會留下看似完整的輸出檔"""
+    temp_path = partial_output_path(output_path)
+    shutil.copyfile(source_path, temp_path)
+    os.replace(temp_path, output_path)
+
+
+def compress_pdf_checked(input_path, output_path, min_gain=MIN_PREDICTED_GAIN, on_progress=None,
+                         **compress_options):
+    """
+    壓縮前先預估效果，壓縮後檢查結果，供批次使用
+
+    預估可減少的比例低於 min_gain 時不壓縮（目標大小模式不做預估）；壓縮結果比原檔大時捨棄。
+    兩種情況都直接複製原檔到 output_path，狀態為 'skipped'，result 為原因。
+    目標大小模式壓不到 target_size 以下時，仍輸出最小的結果，狀態為 'over_budget'，success 為 False。
+    壓縮結果先寫到暫存檔，成功後才改名為 output_path。
+    回傳 (status, success, result, original_size, compressed_size, stats)，
+    stats 為耗時統計，Ghostscript 一般模式另含頁數、頁/秒與每頁耗時，
+    目標大小模式與自動模式另含選用的設定（見 compress_pdf）。
+    """
+    start = time.perf_counter()
+    stats = {}
+
+    def track(progress):
+        if progress.get('done'):
+            stats['pages'] = len(progress['page_times'])
+            stats['pages_per_second'] = round(progress['pages_per_second'], 3)
+            stats['page_times'] = progress['page_times']
+        if on_progress:
+            on_progress(progress)
+
+    if compress_options.get('engine', 'ghostscript') == 'ghostscript':
+        compress_options['on_progress'] = track
+        compress_options['stats'] = stats
+
+    try:
+        status, success, result, original_size, compressed_size = _compress_pdf_checked(
+            input_path, output_path, min_gain, **compress_options)
+    except OSError as e:
+        # 讀不到原檔或寫不進輸出資料夾只影響這個檔案
+        status, success, result, original_size, compressed_size = 'failed', False, str(e), 0, 0
+    stats['elapsed'] = round(time.perf_counter() - start, 3)
+    return status, success, result, original_size, compressed_size, stats
+
+
+def _compress_pdf_checked(input_path, output_path, min_gain, **compress_options):
+    """compress_pdf_checked 的實際流程，回傳 (status, success, result, original_size, compressed_size)"""
+    # 空檔案或不是 PDF 的檔案直接視為失敗，不複製也不寫入快取紀錄
+    with open(input_path, 'rb') as f:
+        header = f.read(1024)
+    if not header:
+        return 'failed', False, "檔案是空的", 0, 0
+    if b'%PDF-' not in header:
+        return 'failed', False, "不是有效的 PDF 檔", 0, 0
+
+    # 目標大小模式必須實際壓縮到上限以下，預估效果再低也不能直接複製原檔
+    if min_gain and not compress_options.get('target_size'):
+        try:
+            analysis = analyze_pdf(input_path, expected_dpi(**compress_options))
+        except (OSError, ValueError):
+            analysis = None
+        if analysis and analysis['predicted_gain'] < min_gain:
+            copy_atomic(input_path, output_path)
+            size = analysis['file_size']
+            reason = (f"預估只能減少 {analysis['predicted_gain']:.1%}"
+                      f"（影像占 {analysis['image_fraction']:.0%}），直接複製原檔")
+            return 'skipped', True, reason, size, size
+
+    temp_path = partial_output_path(output_path)
+    try:
+        success, result, original_size, compressed_size = compress_pdf(input_path, str(temp_path),
+                                                                       **compress_options)
+        if not success:
+            # 目標大小模式壓不到上限時仍輸出最小的結果（或較小的原檔），狀態標示為 'over_budget'
+            if compress_options.get('target_size') and compressed_size and temp_path.exists():
+                if compressed_size >= original_size:
+                    copy_atomic(input_path, output_path)
+                    compressed_size = original_size
+                else:
+                    os.replace(temp_path, output_path)
+                return ('over_budget', False, f"{result}，已輸出最小的結果（{format_size(compressed_size)}）",
+                        original_size, compressed_size)
+            return 'failed', success, result, original_size, compressed_size
+
+        if compressed_size >= original_size:
+            copy_atomic(input_path, output_path)
+            reason = f"壓縮後沒有變小（{format_size(compressed_size)}），改用原檔"
+            return 'skipped', True, reason, original_size, original_size
+
+        os.replace(temp_path, output_path)
+        return 'compressed', success, result, original_size, compressed_size
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def compress_settings_key(pdf_settings='/ebook', resolution=None, jpeg_quality=None, target_size=None,
+                          min_dpi=150, shard_min_pages=None, shard_min_bytes=None, shard_workers=None,
+                          engine='ghostscript', session=None, stats=None):
+    """回傳代表壓縮設定的字串，作為批次快取的一部分"""
+    if engine == 'pikepdf':
+        return f'pikepdf jpeg_quality={jpeg_quality or 70}'
+    if target_size:
+        return ' '.join(ghostscript_options()) + f' target_size={target_size}'
+    if pdf_settings == 'auto':
+        names = ','.join(preset['name'] for preset in auto_presets(min_dpi))
+        return f'auto min_dpi={min_dpi} presets={names}'
+    return ' '.join(ghostscript_options(pdf_settings, resolution, jpeg_quality))
+
+
 def format_size(size):
     """將檔案大小轉換為易讀格式"""
     for unit in ['B', 'KB', 'MB', 'GB']:
@@ -62,70 +925,584 @@ def format_size(size):
     return f"{size:.2f} GB"
 
 
-def main():
-    # 檢查 Ghostscript
-    if not install_ghostscript():
-        return
+MANIFEST_NAME = '.compress_manifest.json'
 
-    # 取得桌面路徑
-    desktop = Path.home() / 'Desktop'
-    input_folder = desktop / 'PDF'
-    output_folder = desktop / 'PDF_Compressed'
 
-    # 確保輸出資料夾存在
+def file_sha256(path, chunk_size=1024 * 1024):
+    """計算檔案內容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(output_folder):
+    """讀取輸出資料夾中的壓縮紀錄，不存在或損毀時回傳空紀錄"""
+    manifest_path = Path(output_folder) / MANIFEST_NAME
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == 1:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'version': 1, 'files': {}, 'outputs': {}}
+
+
+def save_manifest(output_folder, manifest):
+    """先寫入暫存檔再改名，避免中斷時留下寫一半的紀錄"""
+    manifest_path = Path(output_folder) / MANIFEST_NAME
+    temp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, manifest_path)
+
+
+JOURNAL_NAME = '.compress_journal.jsonl'
+REPORT_NAME = 'compress_report.json'
+
+
+def replay_journal(output_folder, manifest):
+    """
+    將上次中斷的批次已完成的檔案併入壓縮紀錄
+
+    日誌每完成一個檔案就附加一行，批次正常結束並存檔後才刪除；
+    最後一行可能只寫了一半，解析失敗的行直接略過。
+    """
+    journal_path = Path(output_folder) / JOURNAL_NAME
+    if not journal_path.exists():
+        return 0
+
+    replayed = 0
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            manifest['files'][record['source']] = record['file']
+            manifest['outputs'][record['cache_key']] = record['output']
+            replayed += 1
+    return replayed
+
+
+def append_journal(journal, record):
+    """附加一行日誌並立即寫入磁碟"""
+    journal.write(json.dumps(record, ensure_ascii=False) + '\n')
+    journal.flush()
+    os.fsync(journal.fileno())
+
+
+def manifest_digest(manifest, pdf_file):
+    """
+    取得檔案的內容雜湊
+
+    檔案大小與修改時間都沒變時直接沿用紀錄中的雜湊，否則重新計算。
+    """
+    stat = pdf_file.stat()
+    key = str(pdf_file.resolve())
+    record = manifest['files'].get(key)
+    if record and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+        return record['sha256']
+
+    digest = file_sha256(pdf_file)
+    manifest['files'][key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+    return digest
+
+
+def find_cached_output(manifest, cache_key, output_folder, output_path):
+    """
+    依快取紀錄尋找已壓縮的結果，找到時回傳 (original_size, compressed_size)
+
+    相同內容的檔案若已用相同設定壓縮過（例如不同檔名的副本），直接複製先前的結果。
+    """
+    entry = manifest['outputs'].get(cache_key)
+    if not entry:
+        return None
+
+    if output_path.exists() and output_path.stat().st_size == entry['compressed_size']:
+        return entry['original_size'], entry['compressed_size']
+
+    cached_output = output_folder / entry['output']
+    if cached_output.exists() and cached_output.stat().st_size == entry['compressed_size']:
+        copy_atomic(cached_output, output_path)
+        return entry['original_size'], entry['compressed_size']
+
+    return None
+
+
+def find_pdf_files(input_folder, recursive=False, exclude=None):
+    """列出資料夾中的 PDF 檔案，recursive 為 True 時包含所有子資料夾（略過 exclude 資料夾）"""
+    exclude = Path(exclude).resolve() if exclude else None
+    pdf_files = []
+    pending = [Path(input_folder)]
+    while pending:
+        folder = pending.pop()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and not entry.name.startswith('.') and Path(entry.path).resolve() != exclude:
+                        pending.append(Path(entry.path))
+                elif entry.is_file() and entry.name.lower().endswith('.pdf'):
+                    pdf_files.append(Path(entry.path))
+    return pdf_files
+
+
+def batch_output_path(pdf_file, output_folder, input_folder=None):
+    """
+    回傳批次壓縮的輸出路徑
+
+    指定 input_folder 時依檔案相對於 input_folder 的位置建立相同的子資料夾結構。
+    """
+    output_dir = Path(output_folder)
+    if input_folder:
+        output_dir = output_dir / pdf_file.parent.relative_to(input_folder)
+    return output_dir / f"compressed_{pdf_file.name}"
+
+
+def save_batch_report(output_folder, results):
+    """將每個檔案的狀態與耗時統計寫入輸出資料夾的 JSON 報告，方便找出特別慢的檔案"""
+    files = []
+    for pdf_file, status, success, result, original_size, compressed_size, stats in results:
+        entry = {
+            'file': str(pdf_file),
+            'status': status,
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+        }
+        if isinstance(result, str):
+            entry['message'] = result
+        else:
+            entry['ratio'] = round(result, 2)
+        entry.update(stats)
+        files.append(entry)
+
+    report_path = Path(output_folder) / REPORT_NAME
+    temp_path = report_path.with_name(report_path.name + '.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'files': files}, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, report_path)
+
+
+def _file_size(path):
+    """檔案大小，讀不到時回傳 0（交由壓縮時回報失敗）"""
+    try:
+        return path.stat().st_size
+    except OSError:
+        return 0
+
+
+def compress_pdf_batch(pdf_files, output_folder, max_workers=None, on_result=None, use_cache=True,
+                       min_gain=MIN_PREDICTED_GAIN, input_folder=None, on_progress=None, persistent=False,
+                       **compress_options):
+    """
+    平行壓縮多個 PDF，大檔優先排程
+
+    指定 input_folder 時，輸出會依各檔案相對於 input_folder 的位置放在對應的子資料夾，
+    搭配 find_pdf_files(recursive=True) 可壓縮整個資料夾樹。
+
+    每個 Ghostscript 行程都是單執行緒，因此以執行緒池同時執行多個 compress_pdf。
+    use_cache 為 True 時，內容與壓縮設定都沒變的檔案不會重新壓縮，狀態標示為 'cached'；
+    每完成一個檔案就寫入日誌，批次中斷（例如重新開機）後再次執行會從中斷處繼續。
+    預估效果低於 min_gain 或壓縮後變大的檔案直接複製原檔，狀態標示為 'skipped'，
+    詳見 compress_pdf_checked。
+    回傳 (pdf_file, status, success, result, original_size, compressed_size, stats) 的列表，
+    status 為 'compressed'、'cached'、'skipped'、'over_budget' 或 'failed'，順序與完成順序相同，
+    stats 見 compress_pdf_checked（快取的檔案為空字典）；
+    on_result 會在每個檔案完成時以同樣的 tuple 呼叫；on_progress 會收到各檔案的逐頁進度
+    （格式見 run_ghostscript_with_progress，可能由不同執行緒呼叫）。
+    批次結束時在輸出資料夾寫入 compress_report.json，記錄每個檔案的狀態與耗時。
+    persistent 為 True 時，小於 PERSISTENT_MAX_BYTES 的檔案改由每個執行緒長駐的 Ghostscript 壓縮
+    （只適用一般模式），省下每個檔案啟動 Ghostscript 的時間；長駐直譯器以 -dNOSAFER 執行，
+    只適合可信任的檔案，詳見 GhostscriptSession。長駐直譯器失敗的檔案會改用一般模式重試。
+    其餘參數（pdf_settings、resolution、jpeg_quality、target_size、min_dpi、
+    shard_min_pages、shard_min_bytes、shard_workers、engine）會傳給 compress_pdf；
+    未指定 shard_workers 時，分段的同時段數為 CPU 核心數除以同時處理的檔案數，避免同時執行過多 Ghostscript。
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+        # 自動模式每個檔案會同時開多個 Ghostscript，減少同時處理的檔案數
+        if compress_options.get('pdf_settings') == 'auto':
+            candidate_count = len(auto_presets(compress_options.get('min_dpi', 150)))
+            max_workers = max(1, max_workers // max(candidate_count, 1))
+
+    # 大檔案先排程，避免最後只剩一個大檔在跑
+    pdf_files = sorted((Path(f) for f in pdf_files), key=_file_size, reverse=True)
+    # 分段模式每個檔案也會同時開多個 Ghostscript，與同時處理的檔案共用 CPU 核心數
+    if ((compress_options.get('shard_min_pages') or compress_options.get('shard_min_bytes'))
+            and not compress_options.get('shard_workers')):
+        busy_workers = min(max_workers, len(pdf_files)) or 1
+        compress_options['shard_workers'] = max(1, (os.cpu_count() or 1) // busy_workers)
+    output_folder = Path(output_folder)
     output_folder.mkdir(parents=True, exist_ok=True)
+    manifest = None
+    journal = None
+    if use_cache:
+        manifest = load_manifest(output_folder)
+        if replay_journal(output_folder, manifest):
+            print("發現未完成的批次紀錄，從中斷處繼續")
+        journal = open(output_folder / JOURNAL_NAME, 'a', encoding='utf-8')
+    settings = compress_settings_key(**compress_options)
+    if min_gain:
+        settings += f' min_gain={min_gain}'
 
-    # 檢查輸入資料夾
-    if not input_folder.exists():
-        messagebox.showerror("錯誤", f"找不到輸入資料夾: {input_folder}")
-        return
+    results = []
 
-    # 取得所有PDF檔案
-    pdf_files = list(input_folder.glob('*.pdf'))
+    def report(entry):
+        results.append(entry)
+        if on_result:
+            on_result(entry)
 
-    if not pdf_files:
-        messagebox.showinfo("提示", "PDF資料夾中沒有PDF檔案")
+    pool = None
+    plain_mode = (compress_options.get('engine', 'ghostscript') == 'ghostscript'
+                  and not compress_options.get('target_size') and compress_options.get('pdf_settings') != 'auto')
+    if persistent and plain_mode:
+        options = ghostscript_options(compress_options.get('pdf_settings', '/ebook'),
+                                      compress_options.get('resolution'), compress_options.get('jpeg_quality'))
+        pool = GhostscriptPool(options)
+
+    try:
+        # Ghostscript 在子行程中執行，執行緒就夠用；內建引擎在 Python 中運算，改用行程池
+        executor_class = ProcessPoolExecutor if compress_options.get('engine') == 'pikepdf' else ThreadPoolExecutor
+        with executor_class(max_workers=max_workers) as executor:
+            futures = {}
+            for pdf_file in pdf_files:
+                # 單一檔案讀不到（例如被其他程式鎖定）只讓這個檔案失敗，其他檔案繼續處理
+                try:
+                    output_path = batch_output_path(pdf_file, output_folder, input_folder)
+                    output_path.parent.mkdir(parents=True, exist_ok=True)
+                    cache_key = None
+
+                    if manifest is not None:
+                        cache_key = f"{manifest_digest(manifest, pdf_file)}:{settings}"
+                        cached = find_cached_output(manifest, cache_key, output_folder, output_path)
+                        if cached:
+                            original_size, compressed_size = cached
+                            ratio = (1 - compressed_size / original_size) * 100 if original_size else 0.0
+                            report((pdf_file, 'cached', True, ratio, original_size, compressed_size, {}))
+                            continue
+
+                    use_session = pool and pdf_file.stat().st_size < PERSISTENT_MAX_BYTES
+                except OSError as e:
+                    report((pdf_file, 'failed', False, str(e), 0, 0, {}))
+                    continue
+
+                # 進度回呼無法傳給其他行程，只在執行緒池中使用
+                progress_callback = on_progress if executor_class is ThreadPoolExecutor else None
+                file_options = compress_options
+                if use_session:
+                    file_options = dict(compress_options, session=pool)
+                future = executor.submit(compress_pdf_checked, str(pdf_file), str(output_path), min_gain,
+                                         progress_callback, **file_options)
+                futures[future] = (pdf_file, output_path, cache_key)
+
+            for future in as_completed(futures):
+                pdf_file, output_path, cache_key = futures[future]
+                try:
+                    status, success, result, original_size, compressed_size, stats = future.result()
+                except Exception as e:
+                    # 例如內建引擎的工作行程異常結束
+                    status, success, result, original_size, compressed_size, stats = 'failed', False, str(e), 0, 0, {}
+
+                if success and cache_key:
+                    source = str(pdf_file.resolve())
+                    manifest['outputs'][cache_key] = {
+                        'output': output_path.relative_to(output_folder).as_posix(),
+                        'original_size': original_size,
+                        'compressed_size': compressed_size,
+                    }
+                    append_journal(journal, {
+                        'source': source,
+                        'file': manifest['files'][source],
+                        'cache_key': cache_key,
+                        'output': manifest['outputs'][cache_key],
+                    })
+
+                report((pdf_file, status, success, result, original_size, compressed_size, stats))
+    finally:
+        if pool:
+            pool.close()
+        # 中途失敗也保存已完成的紀錄，紀錄存檔後日誌就不再需要
+        if manifest is not None:
+            journal.close()
+            save_manifest(output_folder, manifest)
+            os.remove(output_folder / JOURNAL_NAME)
+        save_batch_report(output_folder, results)
+
+    return results
+
+
+def _fingerprint(obj, memo):
+    """
+    計算物件內容的雜湊，內容相同的影像或字型在不同檔案中也會得到相同結果
+
+    串流包含原始資料與字典（不含 /Length），間接參照會以被參照物件的內容計算。
+    """
+    import pikepdf
+
+    indirect = isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream, pikepdf.Array)) and obj.is_indirect
+    if indirect:
+        if obj.objgen in memo:
+            return memo[obj.objgen]
+        memo[obj.objgen] = b''  # 防止循環參照
+
+    digest = hashlib.sha256()
+    if isinstance(obj, pikepdf.Stream):
+        digest.update(b'stream')
+        digest.update(obj.read_raw_bytes())
+        for key in sorted(obj.keys()):
+            if key != '/Length':
+                digest.update(key.encode() + _fingerprint(obj[key], memo))
+    elif isinstance(obj, pikepdf.Dictionary):
+        digest.update(b'dict')
+        for key in sorted(obj.keys()):
+            digest.update(key.encode() + _fingerprint(obj[key], memo))
+    elif isinstance(obj, pikepdf.Array):
+        digest.update(b'array')
+        for item in obj:
+            digest.update(_fingerprint(item, memo))
+    else:
+        digest.update(repr(obj).encode())
+
+    result = digest.digest()
+    if indirect:
+        memo[obj.objgen] = result
+    return result
+
+
+def _replace_references(obj, duplicates):
+    """把指向重複物件的參照改為指向保留的那一份，會遞迴處理直接內嵌的字典與陣列"""
+    import pikepdf
+
+    if isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+        items = [(key, obj[key]) for key in obj.keys()]
+    elif isinstance(obj, pikepdf.Array):
+        items = list(enumerate(obj))
+    else:
         return
 
-    # 處理每個檔案
-    results = []
-    total_original_size = 0
-    total_compressed_size = 0
+    for key, value in items:
+        # 數字、布林等會被轉成 Python 型別，沒有 is_indirect
+        if getattr(value, 'is_indirect', False):
+            if value.objgen in duplicates:
+                obj[key] = duplicates[value.objgen]
+        elif isinstance(value, (pikepdf.Dictionary, pikepdf.Array)):
+            _replace_references(value, duplicates)
+
+
+def merge_pdfs(pdf_files, output_path):
+    """
+    將多個 PDF 合併成一個檔案，內容相同的影像與字型只保存一份
+
+    每個來源檔在合併後的檔案中有一個書籤。合併時以內容雜湊找出重複的影像 XObject
+    與內嵌字型程式（FontFile、FontFile2、FontFile3），所有參照改指向同一份，
+    存檔時沒有被參照的副本就不會寫出。
+    回傳 (success, result, original_size, merged_size, stats)，
+    stats 為 {'files', 'images_removed', 'fonts_removed'}。
+    """
+    try:
+        import pikepdf
+        from pikepdf import Name, OutlineItem
+    except ImportError:
+        return False, "合併需要 pikepdf，請先執行: pip install pikepdf", 0, 0, None
+
+    sources = []
+    try:
+        original_size = sum(os.path.getsize(pdf_file) for pdf_file in pdf_files)
+        merged = pikepdf.new()
+        bookmarks = []
 
-    for pdf_file in pdf_files:
-        input_path = str(pdf_file)
-        output_path = str(output_folder / f"compressed_{pdf_file.name}")
+        # 來源檔必須保持開啟到合併結果存檔為止
+        for pdf_file in pdf_files:
+            source = pikepdf.open(pdf_file)
+            sources.append(source)
+            bookmarks.append(OutlineItem(Path(pdf_file).stem, len(merged.pages)))
+            merged.pages.extend(source.pages)
 
-        success, result, original_size, compressed_size = compress_pdf(input_path, output_path)
+        with merged.open_outline() as outline:
+            outline.root.extend(bookmarks)
+
+        # 找出影像與字型程式
+        candidates = []
+        for obj in merged.objects:
+            if isinstance(obj, pikepdf.Stream) and obj.get('/Subtype') == Name.Image:
+                candidates.append(('image', obj))
+            elif isinstance(obj, pikepdf.Dictionary) and obj.get('/Type') == Name.FontDescriptor:
+                for key in ('/FontFile', '/FontFile2', '/FontFile3'):
+                    if key in obj and getattr(obj[key], 'is_indirect', False):
+                        candidates.append(('font', obj[key]))
+
+        memo = {}
+        canonical = {}
+        duplicates = {}
+        stats = {'files': len(pdf_files), 'images_removed': 0, 'fonts_removed': 0}
+        for kind, obj in candidates:
+            if obj.objgen in duplicates:
+                continue
+            key = (kind, _fingerprint(obj, memo))
+            if key not in canonical:
+                canonical[key] = obj
+            elif canonical[key].objgen != obj.objgen:
+                duplicates[obj.objgen] = canonical[key]
+                stats['images_removed' if kind == 'image' else 'fonts_removed'] += 1
+
+        if duplicates:
+            for obj in merged.objects:
+                _replace_references(obj, duplicates)
+
+        merged.save(output_path, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate)
+
+        merged_size = os.path.getsize(output_path)
+        compression_ratio = (1 - merged_size / original_size) * 100
+        return True, compression_ratio, original_size, merged_size, stats
+
+    except Exception as e:
+        return False, str(e), 0, 0, None
+
+    finally:
+        for source in sources:
+            source.close()
+
+
+def merge_and_compress(pdf_files, output_path, min_gain=MIN_PREDICTED_GAIN, **compress_options):
+    """
+    先以 merge_pdfs 合併並去除重複的影像與字型，再壓縮合併後的檔案
 
+    回傳 (success, result, original_size, compressed_size, stats)，壓縮率以所有來源檔的總大小計算。
+    """
+    output_path = Path(output_path)
+    merged_path = output_path.with_name(f".merged_{output_path.name}")
+    try:
+        success, result, original_size, merged_size, stats = merge_pdfs(pdf_files, str(merged_path))
+        if not success:
+            return False, result, 0, 0, None
+
+        status, success, result, _, compressed_size, _ = compress_pdf_checked(
+            str(merged_path), str(output_path), min_gain, **compress_options)
+        if not success:
+            return False, result, 0, 0, None
+
+        compression_ratio = (1 - compressed_size / original_size) * 100
+        return True, compression_ratio, original_size, compressed_size, stats
+    finally:
+        if merged_path.exists():
+            merged_path.unlink()
+
+
+def format_chosen_settings(stats):
+    """將目標大小模式或自動模式選用的設定整理成文字，沒有時回傳空字串"""
+    if stats.get('settings'):
+        settings = stats['settings']
+        return f"解析度 {settings['resolution']} DPI，JPEG 品質 {settings['jpeg_quality']}"
+    return stats.get('preset', '')
+
+
+def format_batch_summary(results):
+    """將批次結果整理成報告文字，最後附上總體壓縮率"""
+    lines = []
+    total_original_size = 0
+    total_compressed_size = 0
+    cached_count = 0
+    skipped_count = 0
+
+    for pdf_file, status, success, result, original_size, compressed_size, stats in results:
         if success:
             total_original_size += original_size
             total_compressed_size += compressed_size
-            results.append(
+            if status == 'skipped':
+                skipped_count += 1
+                lines.append(f"{pdf_file.name}: 未壓縮 - {result}\n")
+                continue
+            if status == 'cached':
+                cached_count += 1
+                lines.append(f"{pdf_file.name}: 已壓縮過，沿用先前結果（{result:.1f}%）\n")
+                continue
+            lines.append(
                 f"{pdf_file.name}:\n"
                 f"原始大小: {format_size(original_size)}\n"
                 f"壓縮後: {format_size(compressed_size)}\n"
                 f"壓縮率: {result:.1f}%\n"
             )
+            chosen = format_chosen_settings(stats)
+            if chosen:
+                lines.append(f"選用設定: {chosen}\n")
+        elif status == 'over_budget':
+            lines.append(f"{pdf_file.name}: 超過大小上限 - {result}\n")
         else:
-            results.append(f"{pdf_file.name}: 壓縮失敗 - {result}\n")
+            lines.append(f"{pdf_file.name}: 壓縮失敗 - {result}\n")
 
     # 計算總體壓縮率
     if total_original_size > 0:
         total_compression_ratio = (1 - total_compressed_size / total_original_size) * 100
-        summary = (
+        lines.append(
             f"\n總結:\n"
             f"總原始大小: {format_size(total_original_size)}\n"
             f"總壓縮後大小: {format_size(total_compressed_size)}\n"
-            f"總體壓縮率: {total_compression_ratio:.1f}%"
+            f"總體壓縮率: {total_compression_ratio:.1f}%\n"
+            f"沿用快取: {cached_count} 個檔案\n"
+            f"未壓縮: {skipped_count} 個檔案"
         )
-        results.append(summary)
 
-    # 顯示結果
+    return "".join(lines)
+
+
+def main():
+    # 檢查 Ghostscript
+    if not install_ghostscript():
+        return
+
+    # 取得桌面路徑
+    desktop = Path.home() / 'Desktop'
+    input_folder = desktop / 'PDF'
+    output_folder = desktop / 'PDF_Compressed'
+
+    # 確保輸出資料夾存在
+    output_folder.mkdir(parents=True, exist_ok=True)
+
+    # 檢查輸入資料夾
+    if not input_folder.exists():
+        messagebox.showerror("錯誤", f"找不到輸入資料夾: {input_folder}")
+        return
+
+    # 取得所有PDF檔案
+    pdf_files = list(input_folder.glob('*.pdf'))
+
+    if not pdf_files:
+        messagebox.showinfo("提示", "PDF資料夾中沒有PDF檔案")
+        return
+
+    # 長駐模式不受 Ghostscript 的 SAFER 保護，預設不使用，只在使用者確認檔案都可信任時啟用
+    persistent = messagebox.askyesno(
+        "長駐模式",
+        "長駐模式可加快大量小檔的壓縮，但惡意的 PDF 可以讀寫電腦上的任意檔案。\n"
+        "只適合自己產生的文件，廠商收據或外來的檔案請選「否」。\n\n"
+        "檔案都來自可信任的來源，使用長駐模式？",
+        icon=messagebox.WARNING, default=messagebox.NO)
+
+    # 進度視窗
     root = tk.Tk()
-    root.withdraw()
-    messagebox.showinfo("完成", "".join(results))
+    root.title("PDF 壓縮")
+    status_var = tk.StringVar(value=f"共 {len(pdf_files)} 個檔案，壓縮中...")
+    tk.Label(root, textvariable=status_var, width=60, padx=10, pady=10).pack()
+
+    def on_progress(progress):
+        root.after(0, status_var.set, format_progress(progress))
+
+    def run_batch():
+        # 平行處理所有檔案，超大檔案再切段平行壓縮
+        results = compress_pdf_batch(pdf_files, output_folder, shard_min_bytes=SHARD_MIN_BYTES,
+                                     on_progress=on_progress, persistent=persistent)
+        root.after(0, show_results, results)
+
+    def show_results(results):
+        # 顯示結果
+        messagebox.showinfo("完成", format_batch_summary(results))
+        root.destroy()
+
+    threading.Thread(target=run_batch, daemon=True).start()
+    root.mainloop()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
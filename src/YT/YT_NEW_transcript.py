@@ -10,6 +10,9 @@ import sys
 import jieba
 import re
 
+from src.text_correct import correct_text
+from src.text_index import format_timestamp, index_output
+
 # 忽略特定警告
 warnings.filterwarnings("ignore", category=FutureWarning)
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -217,13 +220,17 @@ class YouTubeTranscriber:
             try:
                 segments = result["segments"]
                 formatted_text = ""
+                # 搜尋索引以段落開始時間標示位置
+                index_chunks = []
 
                 for segment in segments:
-                    # 取得該段文字並清理
-                    segment_text = segment["text"].strip()
+                    # 取得該段文字並清理，依錯字對照表校正
+                    segment_text = correct_text(segment["text"].strip())
                     if not segment_text:
                         continue
 
+                    segment_offset = len(formatted_text)
+
                     # 使用結巴分詞
                     words = list(jieba.cut(segment_text))
 
@@ -246,6 +253,7 @@ class YouTubeTranscriber:
 
                     # 每個段落後添加換行
                     formatted_text += "\n"
+                    index_chunks.append((format_timestamp(segment["start"]), formatted_text[segment_offset:].strip()))
 
                 # 最終清理：移除多餘的空行和空格
                 formatted_text = re.sub(r'\n+', '\n', formatted_text.strip())
@@ -254,6 +262,7 @@ class YouTubeTranscriber:
                 with open(output_path, "w", encoding="utf-8") as f:
                     f.write(formatted_text)
                 self.log_progress(f"成功將轉錄結果寫入: {output_path}")
+                index_output(output_path, index_chunks)
 
             except Exception as e:
                 self.log_progress(f"寫入檔案失敗: {str(e)}")
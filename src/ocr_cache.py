@@ -0,0 +1,82 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+# 快取檔位置與大小上限，超過上限時先刪除最久沒用到的結果
+OCR_CACHE_PATH = os.path.expanduser("~/.picscan/ocr_cache.sqlite")
+OCR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_connection = None
+
+
+def _get_connection():
+    """每個行程開一個連線；多個工作行程可同時讀寫同一個快取檔"""
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(OCR_CACHE_PATH), exist_ok=True)
+        _connection = sqlite3.connect(OCR_CACHE_PATH, timeout=30)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        _connection.execute("CREATE INDEX IF NOT EXISTS ocr_cache_last_used ON ocr_cache (last_used)")
+        _connection.commit()
+    return _connection
+
+
+def cache_key(image, lang, dpi, engine_version):
+    """以圖片像素內容、語言、解析度與 OCR 引擎版本組成快取鍵"""
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}|{image.size[0]}x{image.size[1]}|".encode())
+    digest.update(image.tobytes())
+    digest.update(f"|{lang}|{dpi}|{engine_version}".encode())
+    return digest.hexdigest()
+
+
+def get_cached_text(key):
+    """取得快取的辨識結果，沒有時回傳 None"""
+    try:
+        connection = _get_connection()
+        row = connection.execute("SELECT text FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE ocr_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        connection.commit()
+        return row[0]
+    except sqlite3.Error as e:
+        print(f"讀取 OCR 快取失敗: {str(e)}")
+        return None
+
+
+def put_cached_text(key, text):
+    """存入辨識結果，超過大小上限時刪除最久沒用到的結果"""
+    try:
+        connection = _get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO ocr_cache (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+            (key, text, len(text.encode('utf-8')) + len(key), time.time())
+        )
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        if total > OCR_CACHE_MAX_BYTES:
+            stale = []
+            for old_key, size in connection.execute(
+                    "SELECT key, size FROM ocr_cache ORDER BY last_used"):
+                if total <= OCR_CACHE_MAX_BYTES:
+                    break
+                stale.append((old_key,))
+                total -= size
+            connection.executemany("DELETE FROM ocr_cache WHERE key = ?", stale)
+        connection.commit()
+    except sqlite3.Error as e:
+        print(f"寫入 OCR 快取失敗: {str(e)}")
+
+
+def clear_cache():
+    """清空快取"""
+    connection = _get_connection()
+    connection.execute("DELETE FROM ocr_cache")
+    connection.commit()
+    connection.execute("VACUUM")
@@ -0,0 +1,133 @@
+import numpy as np
+
+# 版面分析以 300 DPI 為基準，其他解析度依比例調整下列像素值
+BASE_DPI = 300
+# 分析時把圖片縮成 CELL 像素一格的網格，格內有任何黑點就算有墨
+CELL = 4
+# 空白超過這個寬度（像素）才切開成不同區塊，比字距與行距大、比段落與欄間距小
+MIN_GAP = 24
+# 寬或高小於這個值（像素）的區塊視為雜點
+MIN_REGION = 12
+# 黑點比例超過 GRAPHIC_DENSITY，或大區塊內幾乎每一格都有墨，視為照片、圖形
+GRAPHIC_DENSITY = 0.4
+GRAPHIC_FILL = 0.9
+GRAPHIC_MIN_SIDE = 150
+# 長寬比超過這個值視為單行（橫書）或單欄（直書）
+LINE_ASPECT = 3
+
+# 各種區塊使用的 Tesseract 版面模式
+PSM_BLOCK = 6
+PSM_LINE = 7
+PSM_VERTICAL = 5
+
+
+def otsu_ink(gray):
+    """以 Otsu 門檻區分文字（True）與背景"""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = gray.size
+    levels = np.arange(256)
+    weight_dark = np.cumsum(histogram)
+    weight_light = total - weight_dark
+    sum_dark = np.cumsum(histogram * levels)
+    mean_dark = sum_dark / np.maximum(weight_dark, 1)
+    mean_light = (sum_dark[-1] - sum_dark) / np.maximum(weight_light, 1)
+    between = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    return gray <= int(np.argmax(between))
+
+
+def _segments(mask, min_gap):
+    """mask 中為 True 的範圍，間隔小於 min_gap 的視為同一段，回傳 [(起, 迄)]"""
+    index = np.flatnonzero(mask)
+    if not index.size:
+        return []
+    breaks = np.flatnonzero(np.diff(index) > min_gap)
+    starts = np.concatenate(([index[0]], index[breaks + 1]))
+    ends = np.concatenate((index[breaks], [index[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _xy_cut(grid, top, left, min_gap, right_to_left, regions):
+    """遞迴切割：先找橫向空白由上而下切，切不開再找縱向空白依閱讀方向切"""
+    rows = _segments(grid.any(axis=1), min_gap)
+    if len(rows) > 1:
+        for start, end in rows:
+            _xy_cut(grid[start:end], top + start, left, min_gap, right_to_left, regions)
+        return
+
+    cols = _segments(grid.any(axis=0), min_gap)
+    if len(cols) > 1:
+        for start, end in (reversed(cols) if right_to_left else cols):
+            _xy_cut(grid[:, start:end], top, left + start, min_gap, right_to_left, regions)
+        return
+
+    if rows and cols:
+        regions.append((top + rows[0][0], left + cols[0][0], top + rows[0][1], left + cols[0][1]))
+
+
+def _gap_ratio(mask):
+    """沒有墨的列（或行）所佔比例"""
+    return 1 - mask.mean() if mask.size else 0
+
+
+def classify_region(ink, fill):
+    """
+    判斷區塊類型，回傳 'graphic'、'line'、'vertical' 或 'block'
+
+    ink 為區塊內的黑白像素，fill 為區塊網格中有墨的比例。
+    橫書的行距比字距大，空白列比空白行多；直書相反。
+    """
+    height, width = ink.shape
+    density = ink.mean()
+    if density > GRAPHIC_DENSITY or (fill > GRAPHIC_FILL and min(height, width) > GRAPHIC_MIN_SIDE):
+        return 'graphic'
+    if width > height * LINE_ASPECT:
+        return 'line'
+    if height > width * LINE_ASPECT:
+        return 'vertical'
+    empty_rows = _gap_ratio(ink.any(axis=1))
+    empty_cols = _gap_ratio(ink.any(axis=0))
+    return 'vertical' if empty_cols > empty_rows * 1.5 else 'block'
+
+
+def find_text_regions(image, dpi=None):
+    """
+    找出圖片中的文字區塊，依閱讀順序回傳 [(左, 上, 右, 下, 類型)]
+
+    空白區域與照片、圖形不會出現在結果中。
+    直書區塊佔多數時，左右並排的區塊改為由右而左排序。
+    """
+    scale = (dpi[0] if isinstance(dpi, tuple) else dpi or BASE_DPI) / BASE_DPI
+    gray = np.asarray(image.convert('L'))
+    ink = otsu_ink(gray)
+
+    height, width = ink.shape
+    rows, cols = -(-height // CELL), -(-width // CELL)
+    padded = np.zeros((rows * CELL, cols * CELL), dtype=bool)
+    padded[:height, :width] = ink
+    grid = padded.reshape(rows, CELL, cols, CELL).any(axis=(1, 3))
+    min_gap = max(1, round(MIN_GAP * scale / CELL))
+    min_side = MIN_REGION * scale
+
+    def collect(right_to_left):
+        cells = []
+        _xy_cut(grid, 0, 0, min_gap, right_to_left, cells)
+        regions = []
+        for top, left, bottom, right in cells:
+            box = (left * CELL, top * CELL, min(right * CELL, width), min(bottom * CELL, height))
+            if box[2] - box[0] < min_side or box[3] - box[1] < min_side:
+                continue
+            kind = classify_region(ink[box[1]:box[3], box[0]:box[2]], grid[top:bottom, left:right].mean())
+            if kind != 'graphic':
+                regions.append(box + (kind,))
+        return regions
+
+    regions = collect(right_to_left=False)
+    vertical = sum(1 for region in regions if region[4] == 'vertical')
+    if vertical * 2 > len(regions):
+        regions = collect(right_to_left=True)
+    return regions
+
+
+def region_psm(kind):
+    """區塊類型對應的 Tesseract 版面模式"""
+    return {'line': PSM_LINE, 'vertical': PSM_VERTICAL}.get(kind, PSM_BLOCK)
@@ -0,0 +1,174 @@
+import time
+
+import numpy as np
+from PIL import Image
+
+# Tesseract 在 300 DPI 左右辨識效果最好
+TARGET_DPI = 300
+# 手機照片與螢幕截圖多半只是標示 72 或 96 DPI，不代表實際解析度，視為未知
+UNRELIABLE_DPI = (72, 96)
+# 放大倍率與放大後像素數的上限，避免標示錯誤的大圖放大後耗盡記憶體
+MAX_UPSCALE = 2.0
+MAX_PIXELS = 40_000_000
+
+# 自適應二值化：每個像素與周圍區塊平均值比較，比平均暗 BINARIZE_OFFSET 以上視為文字
+BINARIZE_WINDOW_INCH = 0.1
+BINARIZE_OFFSET = 0.15
+
+# 傾斜校正的搜尋範圍與步距（度），計算時先縮小到 DESKEW_MAX_SIDE
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_STEP = 0.5
+DESKEW_FINE_STEP = 0.1
+DESKEW_MAX_SIDE = 1000
+
+# 邊緣整列（整行）超過這個比例是黑色時視為掃描黑邊；裁切後保留的留白像素
+BORDER_INK_RATIO = 0.5
+CROP_MARGIN = 10
+
+PREPROCESS_STAGES = ('grayscale', 'normalize_dpi', 'binarize', 'deskew', 'crop_border')
+
+
+def to_grayscale(array):
+    """RGB 依亮度權重轉成灰階"""
+    if array.ndim == 2:
+        return array
+    rgb = array[..., :3].astype(np.float32)
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return np.clip(gray, 0, 255).astype(np.uint8)
+
+
+def normalize_dpi(array, dpi, target_dpi=TARGET_DPI):
+    """
+    依來源解析度縮放到 target_dpi，解析度不明或相差不到一成時不處理
+
+    標示為 UNRELIABLE_DPI 的圖片視為解析度不明；放大時倍率不超過 MAX_UPSCALE，
+    放大後也不超過 MAX_PIXELS 像素，此時回傳實際達到的解析度。
+    """
+    if not dpi or round(dpi) in UNRELIABLE_DPI:
+        return array, None
+    if abs(dpi - target_dpi) / target_dpi < 0.1:
+        return array, dpi
+    scale = target_dpi / dpi
+    height, width = array.shape
+    if scale > 1:
+        scale = min(scale, MAX_UPSCALE, (MAX_PIXELS / (height * width)) ** 0.5)
+        if scale < 1.1:
+            return array, dpi
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    resized = Image.fromarray(array).resize(size, Image.LANCZOS)
+    return np.asarray(resized), round(dpi * scale)
+
+
+def binarize(array, dpi=None):
+    """
+    以積分影像計算每個像素周圍的平均亮度，做局部門檻二值化（不受光線不均影響）
+
+    積分影像以 uint32 累加，大圖會溢位，但區塊總和只相差一個視窗的亮度，
+    以同樣會溢位的無號整數相減仍會得到正確結果，記憶體只需 float64 的一半。
+    """
+    window = max(15, int((dpi or TARGET_DPI) * BINARIZE_WINDOW_INCH) | 1)
+    half = window // 2
+    padded = np.pad(array, half + 1, mode='edge').astype(np.uint32)
+    integral = padded.cumsum(axis=0, dtype=np.uint32)
+    del padded
+    integral.cumsum(axis=1, dtype=np.uint32, out=integral)
+    height, width = array.shape
+    total = integral[window:window + height, window:window + width] - integral[:height, window:window + width]
+    total -= integral[window:window + height, :width]
+    total += integral[:height, :width]
+    del integral
+    threshold = total.astype(np.float32)
+    threshold *= (1 - BINARIZE_OFFSET) / (window * window)
+    return np.where(array < threshold, 0, 255).astype(np.uint8)
+
+
+def _projection_score(ink_image, angle):
+    """旋轉後每列黑點數的變化量；文字行對齊水平時，列與列之間的差距最大"""
+    rotated = np.asarray(ink_image.rotate(angle, resample=Image.NEAREST, fillcolor=0))
+    profile = rotated.sum(axis=1, dtype=np.int64)
+    return float(np.square(np.diff(profile)).sum())
+
+
+def estimate_skew(array):
+    """以水平投影找出傾斜角度（度），先粗掃再在最佳角度附近細掃"""
+    ink = (array < 128).astype(np.uint8)
+    ink_image = Image.fromarray(ink)
+    longest = max(ink_image.size)
+    if longest > DESKEW_MAX_SIDE:
+        scale = DESKEW_MAX_SIDE / longest
+        ink_image = ink_image.resize((max(1, round(ink_image.width * scale)),
+                                      max(1, round(ink_image.height * scale))), Image.NEAREST)
+
+    coarse = np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_STEP / 2, DESKEW_STEP)
+    best = max(coarse, key=lambda angle: _projection_score(ink_image, angle))
+    fine = np.arange(best - DESKEW_STEP, best + DESKEW_STEP + DESKEW_FINE_STEP / 2, DESKEW_FINE_STEP)
+    return float(max(fine, key=lambda angle: _projection_score(ink_image, angle)))
+
+
+def deskew(array):
+    """校正傾斜，旋轉後露出的角落補白色"""
+    angle = estimate_skew(array)
+    if abs(angle) < DESKEW_FINE_STEP / 2:
+        return array
+    rotated = Image.fromarray(array).rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return np.asarray(rotated)
+
+
+def crop_border(array):
+    """去掉掃描黑邊，再裁到文字範圍外加 CROP_MARGIN 像素"""
+    ink = array < 128
+    rows, cols = ink.mean(axis=1), ink.mean(axis=0)
+    top, bottom = 0, len(rows)
+    left, right = 0, len(cols)
+    while top < bottom and rows[top] > BORDER_INK_RATIO:
+        top += 1
+    while bottom > top and rows[bottom - 1] > BORDER_INK_RATIO:
+        bottom -= 1
+    while left < right and cols[left] > BORDER_INK_RATIO:
+        left += 1
+    while right > left and cols[right - 1] > BORDER_INK_RATIO:
+        right -= 1
+
+    inner = ink[top:bottom, left:right]
+    ink_rows = np.flatnonzero(inner.any(axis=1))
+    ink_cols = np.flatnonzero(inner.any(axis=0))
+    if not len(ink_rows) or not len(ink_cols):
+        return array
+    y0 = max(top, top + ink_rows[0] - CROP_MARGIN)
+    y1 = min(bottom, top + ink_rows[-1] + 1 + CROP_MARGIN)
+    x0 = max(left, left + ink_cols[0] - CROP_MARGIN)
+    x1 = min(right, left + ink_cols[-1] + 1 + CROP_MARGIN)
+    return array[y0:y1, x0:x1]
+
+
+def preprocess_image(image, dpi=None, stages=PREPROCESS_STAGES, timings=None):
+    """
+    依序執行前處理步驟，回傳 (處理後圖片, 處理後 DPI)
+
+    timings 為字典時，每個步驟的耗時（秒）會累加到對應的鍵。
+    """
+    if isinstance(dpi, tuple):
+        dpi = dpi[0]
+    array = np.asarray(image.convert('RGB') if image.mode not in ('L', 'RGB') else image)
+
+    for stage in stages:
+        start = time.perf_counter()
+        if array.ndim == 3 and stage != 'grayscale':
+            array = to_grayscale(array)
+        if stage == 'grayscale':
+            array = to_grayscale(array)
+        elif stage == 'normalize_dpi':
+            array, dpi = normalize_dpi(array, dpi)
+        elif stage == 'binarize':
+            array = binarize(array, dpi)
+        elif stage == 'deskew':
+            array = deskew(array)
+        elif stage == 'crop_border':
+            array = crop_border(array)
+        else:
+            raise ValueError(f"未知的前處理步驟: {stage}")
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+    return Image.fromarray(array), dpi
+
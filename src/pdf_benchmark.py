@@ -0,0 +1,362 @@
+"""
+PDF 壓縮效能測試
+
+在本機產生合成的測試 PDF（純文字、300 DPI 掃描、向量與影像混合、1000 頁長文件），
+以各種引擎與壓縮等級執行 compress_pdf，量測 MB/秒、頁/秒、壓縮率與最高記憶體用量，
+結果寫成 JSON，可與先前版本的結果比較。
+
+使用方式（於專案根目錄）：
+    python -m src.pdf_benchmark
+    python -m src.pdf_benchmark --corpora text scan --configs gs-ebook pikepdf
+    python -m src.pdf_benchmark --output new.json --compare old.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from src.PDF壓縮 import GS_COMMAND, compress_pdf
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource 模組，改用 psutil（若有安裝）
+    resource = None
+
+# A4 尺寸（點，1/72 英吋）
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud").split()
+
+# 測試用的壓縮設定，參數直接傳給 compress_pdf
+BENCHMARK_CONFIGS = {
+    'gs-screen': {'pdf_settings': '/screen'},
+    'gs-ebook': {'pdf_settings': '/ebook'},
+    'gs-printer': {'pdf_settings': '/printer'},
+    'gs-auto': {'pdf_settings': 'auto'},
+    'pikepdf': {'engine': 'pikepdf'},
+}
+
+
+def write_pdf(path, page_count, build_page):
+    """
+    逐頁寫出 PDF，不把整份文件放在記憶體中
+
+    build_page(index) 回傳 (content, images)，content 為頁面內容串流，
+    images 為 [(名稱, 影像字典內容, 壓縮後資料)]。
+    """
+    offsets = {}
+    kids = []
+    next_number = 4  # 1: Catalog, 2: Pages, 3: 字型
+
+    with open(path, 'wb') as f:
+        def write_object(number, body, stream=None):
+            offsets[number] = f.tell()
+            f.write(f"{number} 0 obj\n".encode())
+            if stream is None:
+                f.write(body.encode() + b"\nendobj\n")
+            else:
+                f.write(f"<< {body} /Length {len(stream)} >>\nstream\n".encode())
+                f.write(stream)
+                f.write(b"\nendstream\nendobj\n")
+
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        write_object(3, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+        for index in range(page_count):
+            content, images = build_page(index)
+
+            xobjects = []
+            for name, image_dict, data in images:
+                write_object(next_number, f"/Type /XObject /Subtype /Image {image_dict} /Filter /FlateDecode", data)
+                xobjects.append(f"/{name} {next_number} 0 R")
+                next_number += 1
+
+            content_number = next_number
+            write_object(content_number, "/Filter /FlateDecode", zlib.compress(content))
+            page_number = content_number + 1
+            write_object(page_number,
+                         f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                         f"/Resources << /Font << /F1 3 0 R >> /XObject << {' '.join(xobjects)} >> >> "
+                         f"/Contents {content_number} 0 R >>")
+            kids.append(f"{page_number} 0 R")
+            next_number = page_number + 1
+
+        write_object(2, f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {page_count} >>")
+        write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = f.tell()
+        f.write(f"xref\n0 {next_number}\n0000000000 65535 f \n".encode())
+        for number in range(1, next_number):
+            f.write(f"{offsets[number]:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {next_number} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+
+def text_content(rng, lines=50, top=PAGE_HEIGHT - 72):
+    """產生一頁文字的內容串流"""
+    parts = [f"BT /F1 11 Tf 72 {top} Td 14 TL".encode()]
+    for _ in range(lines):
+        line = ' '.join(rng.choice(WORDS) for _ in range(12))
+        parts.append(f"({line}) Tj T*".encode())
+    parts.append(b"ET")
+    return b"\n".join(parts)
+
+
+def _vector_content(rng, shapes=150):
+    """產生隨機線條與矩形的內容串流"""
+    parts = [b"q 0.5 w"]
+    for _ in range(shapes):
+        x, y = rng.uniform(36, 559), rng.uniform(36, 806)
+        if rng.random() < 0.5:
+            parts.append(f"{x:.1f} {y:.1f} m {rng.uniform(36, 559):.1f} {rng.uniform(36, 806):.1f} l S".encode())
+        else:
+            parts.append(f"{rng.random():.2f} {rng.random():.2f} {rng.random():.2f} rg "
+                         f"{x:.1f} {y:.1f} {rng.uniform(5, 80):.1f} {rng.uniform(5, 80):.1f} re f".encode())
+    parts.append(b"Q")
+    return b"\n".join(parts)
+
+
+def _scan_image(rng, width, height):
+    """產生類似掃描文件的灰階影像：帶雜訊的白底與一行行的深色字跡"""
+    paper_rows = [bytes(rng.randint(225, 255) for _ in range(width)) for _ in range(16)]
+    ink_rows = []
+    for _ in range(16):
+        row = bytearray(paper_rows[rng.randrange(16)])
+        x = rng.randint(0, width // 10)
+        while x < width * 0.9:
+            length = rng.randint(width // 200, width // 60)
+            row[x:x + length] = bytes(rng.randint(0, 90) for _ in range(len(row[x:x + length])))
+            x += length + rng.randint(width // 400, width // 100)
+        ink_rows.append(bytes(row))
+
+    line_height = max(height // 60, 4)
+    rows = []
+    for y in range(height):
+        in_text = (y // line_height) % 2 == 1 and height * 0.08 < y < height * 0.92
+        rows.append(rng.choice(ink_rows if in_text else paper_rows))
+    return zlib.compress(b"".join(rows), 6)
+
+
+def _rgb_image(rng, width, height):
+    """產生帶雜訊的彩色漸層影像"""
+    rows = []
+    for y in range(0, height, 8):
+        base = bytearray()
+        for x in range(width):
+            noise = rng.randint(-12, 12)
+            base += bytes((min(max(x * 255 // width + noise, 0), 255),
+                           min(max(y * 255 // height + noise, 0), 255),
+                           min(max(128 + noise, 0), 255)))
+        rows.extend([bytes(base)] * min(8, height - y))
+    return zlib.compress(b"".join(rows), 6)
+
+
+def generate_corpus(folder, scale=1.0, seed=1234):
+    """
+    在 folder 產生測試用 PDF，回傳 {名稱: (路徑, 頁數)}
+
+    scale 可按比例調整頁數（例如 0.1 快速測試），影像解析度不變。
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+
+    def pages(count):
+        return max(1, int(count * scale))
+
+    corpora = {}
+
+    # 純文字
+    path = folder / 'text.pdf'
+    count = pages(50)
+    write_pdf(path, count, lambda index: (text_content(rng), []))
+    corpora['text'] = (path, count)
+
+    # 300 DPI 灰階掃描，每頁一張滿版影像；影像相同內容容易被快取，因此預先產生數張輪流使用
+    scan_width, scan_height = PAGE_WIDTH * 300 // 72, PAGE_HEIGHT * 300 // 72
+    scans = [_scan_image(rng, scan_width, scan_height) for _ in range(3)]
+    scan_dict = f"/Width {scan_width} /Height {scan_height} /ColorSpace /DeviceGray /BitsPerComponent 8"
+    path = folder / 'scan.pdf'
+    count = pages(10)
+    write_pdf(path, count, lambda index: (
+        f"q {PAGE_WIDTH} 0 0 {PAGE_HEIGHT} 0 0 cm /Im0 Do Q".encode(),
+        [('Im0', scan_dict, scans[index % len(scans)])],
+    ))
+    corpora['scan'] = (path, count)
+
+    # 向量圖形、文字與彩色影像混合
+    photo_width, photo_height = 1200, 900
+    photo = _rgb_image(rng, photo_width, photo_height)
+    photo_dict = f"/Width {photo_width} /Height {photo_height} /ColorSpace /DeviceRGB /BitsPerComponent 8"
+    path = folder / 'mixed.pdf'
+    count = pages(30)
+    write_pdf(path, count, lambda index: (
+        _vector_content(rng) + b"\n" + text_content(rng, lines=15)
+        + b"\nq 320 0 0 240 200 120 cm /Im0 Do Q",
+        [('Im0', photo_dict, photo)],
+    ))
+    corpora['mixed'] = (path, count)
+
+    # 1000 頁長文件
+    path = folder / 'long.pdf'
+    count = pages(1000)
+    write_pdf(path, count, lambda index: (text_content(rng, lines=20) + b"\n" + _vector_content(rng, 10), []))
+    corpora['long'] = (path, count)
+
+    return corpora
+
+
+def _peak_rss_mb():
+    """回傳本行程與子行程（Ghostscript）的最高記憶體用量（MB），無法取得時回傳 None"""
+    if resource is not None:
+        peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        # macOS 的單位是位元組，Linux 是 KB
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+    except (ImportError, AttributeError):
+        return None
+
+
+def run_case(input_path, page_count, config_name, output_dir):
+    """
+    執行單一測試，在獨立的行程中呼叫以便量測該次的最高記憶體用量
+
+    回傳包含吞吐量、壓縮率與記憶體的結果字典。
+    """
+    output_path = os.path.join(output_dir, f"{Path(input_path).stem}_{config_name}.pdf")
+    start = time.perf_counter()
+    success, result, original_size, compressed_size = compress_pdf(
+        str(input_path), output_path, **BENCHMARK_CONFIGS[config_name])
+    elapsed = time.perf_counter() - start
+
+    record = {'success': success, 'elapsed': round(elapsed, 3), 'peak_rss_mb': _peak_rss_mb()}
+    if success:
+        record.update(
+            mb_per_second=round(original_size / (1024 * 1024) / elapsed, 3),
+            pages_per_second=round(page_count / elapsed, 3),
+            compression_ratio=round(result, 2),
+            original_size=original_size,
+            compressed_size=compressed_size,
+        )
+    else:
+        record['error'] = str(result)[:500]
+    return record
+
+
+def _available(config_name):
+    """檢查設定需要的引擎是否可用"""
+    if BENCHMARK_CONFIGS[config_name].get('engine') == 'pikepdf':
+        try:
+            import pikepdf  # noqa: F401
+            return True
+        except ImportError:
+            return False
+    return shutil.which(GS_COMMAND) is not None
+
+
+def _ghostscript_version():
+    try:
+        result = subprocess.run([GS_COMMAND, '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return result.stdout.decode().strip()
+    except OSError:
+        return None
+
+
+def run_benchmark(corpus_dir, corpora=None, configs=None, repeat=1, scale=1.0):
+    """
+    產生（或沿用）測試檔並執行所有組合，回傳可寫成 JSON 的結果
+
+    每個組合在新的行程中執行 repeat 次，取耗時最短的一次。
+    """
+    corpus = generate_corpus(corpus_dir, scale)
+    corpora = corpora or list(corpus)
+    configs = configs or list(BENCHMARK_CONFIGS)
+
+    results = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for corpus_name in corpora:
+            input_path, page_count = corpus[corpus_name]
+            for config_name in configs:
+                entry = {'corpus': corpus_name, 'config': config_name, 'pages': page_count,
+                         'input_size': os.path.getsize(input_path)}
+                if not _available(config_name):
+                    entry['skipped'] = "引擎未安裝"
+                    results.append(entry)
+                    print(f"{corpus_name:8} {config_name:12} 略過（引擎未安裝）")
+                    continue
+
+                runs = []
+                for _ in range(repeat):
+                    # 每次都用新的行程，最高記憶體用量才不會被前一次影響
+                    with ProcessPoolExecutor(max_workers=1) as executor:
+                        runs.append(executor.submit(run_case, input_path, page_count, config_name,
+                                                    output_dir).result())
+                entry.update(min(runs, key=lambda run: run['elapsed']))
+                results.append(entry)
+
+                if entry['success']:
+                    print(f"{corpus_name:8} {config_name:12} {entry['mb_per_second']:8.2f} MB/s "
+                          f"{entry['pages_per_second']:8.2f} 頁/s 壓縮率 {entry['compression_ratio']:6.1f}% "
+                          f"記憶體 {entry['peak_rss_mb']} MB")
+                else:
+                    print(f"{corpus_name:8} {config_name:12} 失敗: {entry['error']}")
+
+    return {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'ghostscript': _ghostscript_version(),
+        'scale': scale,
+        'results': results,
+    }
+
+
+def compare_results(old, new):
+    """列出兩次測試相同組合的吞吐量與壓縮率差異"""
+    previous = {(entry['corpus'], entry['config']): entry for entry in old['results'] if entry.get('success')}
+    for entry in new['results']:
+        before = previous.get((entry['corpus'], entry['config']))
+        if not before or not entry.get('success'):
+            continue
+        speed = (entry['mb_per_second'] / before['mb_per_second'] - 1) * 100
+        ratio = entry['compression_ratio'] - before['compression_ratio']
+        print(f"{entry['corpus']:8} {entry['config']:12} 速度 {speed:+6.1f}% 壓縮率 {ratio:+6.1f} 個百分點")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF 壓縮效能測試")
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'piccompress_benchmark'),
+                        help="測試檔存放位置")
+    parser.add_argument('--corpora', nargs='*', choices=['text', 'scan', 'mixed', 'long'], help="只測試指定的文件類型")
+    parser.add_argument('--configs', nargs='*', choices=list(BENCHMARK_CONFIGS), help="只測試指定的壓縮設定")
+    parser.add_argument('--repeat', type=int, default=1, help="每個組合執行次數，取最快的一次")
+    parser.add_argument('--scale', type=float, default=1.0, help="頁數比例，例如 0.1 可快速測試")
+    parser.add_argument('--output', default='benchmark_results.json', help="結果 JSON 檔")
+    parser.add_argument('--compare', help="與先前的結果 JSON 比較")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.corpus_dir, args.corpora, args.configs, args.repeat, args.scale)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"結果已保存到: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare_results(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
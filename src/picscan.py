@@ -1,20 +1,108 @@
 import os
 
+import subprocess
 import sys
+import tempfile
+import threading
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import pytesseract
-from PIL import Image
-from pdf2image import convert_from_path
+from PIL import Image, ImageOps
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from src import ocr_cache
+from src.ocr_cache import cache_key, get_cached_text, put_cached_text
+from src.text_correct import correct_text
+from src.text_index import index_output
 
 # 設定 Tesseract 路徑（Windows用戶需要）
 # 請根據您的實際安裝路徑修改
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
+# tesserocr 使用的語言資料夾，找不到時使用 tesserocr 的預設位置
+TESSDATA_PATH = os.path.join(os.path.dirname(pytesseract.pytesseract.tesseract_cmd), 'tessdata')
+
+# OCR 引擎：None 為自動選擇（有安裝 tesserocr 就在行程內辨識），也可指定 'tesserocr' 或 'pytesseract'
+OCR_BACKEND = None
+
+# 辨識語言
+OCR_LANG = 'chi_tra+eng'
+
+# PDF 轉圖片的解析度（與 pdf2image 預設相同）與每次轉換的頁數
+PDF_DPI = 200
+PAGE_WINDOW = 4
+
+# 平行辨識的工作行程數
+OCR_WORKERS = os.cpu_count() or 1
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+# 內嵌文字至少要有這麼多個非空白字元，且可辨認字元的比例要夠高，才不必 OCR
+MIN_TEXT_CHARS = 20
+MIN_GLYPH_COVERAGE = 0.9
+
+# 兩段式辨識：先以 FAST_DPI 快速辨識，信心度不足的行或整頁再以 ACCURATE_DPI 重新辨識
+FAST_DPI = 150
+ACCURATE_DPI = 300
+MIN_PAGE_CONFIDENCE = 75
+MIN_LINE_CONFIDENCE = 60
+# 低信心度的行超過這個比例時，整頁重新辨識比逐行裁切更划算
+WHOLE_PAGE_RATIO = 0.5
+# 重新辨識單行時，外框向外多留的像素（以高解析度計）
+LINE_PADDING = 8
+# 兩段式辨識時只做不改變圖片大小與位置的前處理，行的座標才能對應
+ADAPTIVE_PREPROCESS_STAGES = ('grayscale', 'binarize')
+
+
+_ocr_backend = None
+_thread_state = threading.local()
+
+
+def get_ocr_backend():
+    """
+    決定使用的 OCR 引擎
+
+    tesserocr 直接呼叫 Tesseract API，語言資料只載入一次，圖片也不必寫成暫存檔；
+    沒有安裝時退回 pytesseract（每次辨識啟動一次 tesseract 程式）。
+    """
+    global _ocr_backend
+    if _ocr_backend is None:
+        _ocr_backend = OCR_BACKEND
+        if _ocr_backend is None:
+            try:
+                import tesserocr  # noqa: F401
+                _ocr_backend = 'tesserocr'
+            except ImportError:
+                _ocr_backend = 'pytesseract'
+    return _ocr_backend
+
+
+def _get_tesserocr_api(lang):
+    """每個執行緒每種語言保留一個已初始化的 Tesseract 引擎"""
+    import tesserocr
+
+    apis = getattr(_thread_state, 'apis', None)
+    if apis is None:
+        apis = _thread_state.apis = {}
+    api = apis.get(lang)
+    if api is None:
+        if os.path.isdir(TESSDATA_PATH):
+            api = tesserocr.PyTessBaseAPI(path=TESSDATA_PATH, lang=lang)
+        else:
+            api = tesserocr.PyTessBaseAPI(lang=lang)
+        apis[lang] = api
+    return api
+
 
 def check_tesseract():
     """檢查 Tesseract 是否正確安裝"""
     try:
-        pytesseract.get_tesseract_version()
-        print("Tesseract 安裝正確")
+        if get_ocr_backend() == 'tesserocr':
+            _get_tesserocr_api(OCR_LANG)
+            print("Tesseract 安裝正確（使用 tesserocr）")
+        else:
+            pytesseract.get_tesseract_version()
+            print("Tesseract 安裝正確")
         return True
     except Exception as e:
         print(f"Tesseract 錯誤: {str(e)}")
@@ -22,14 +110,360 @@ def check_tesseract():
         return False
 
 
-def scan_image(file_path):
-    """處理圖片文件的文字辨識"""
+_tesseract_version = None
+
+
+def get_tesseract_version():
+    """取得 Tesseract 版本字串，每個行程只查詢一次"""
+    global _tesseract_version
+    if _tesseract_version is None:
+        if get_ocr_backend() == 'tesserocr':
+            import tesserocr
+            # 格式為 "tesseract 5.3.0\n leptonica-..."
+            _tesseract_version = tesserocr.tesseract_version().split()[1]
+        else:
+            _tesseract_version = str(pytesseract.get_tesseract_version())
+    return _tesseract_version
+
+
+def run_ocr(image, lang=OCR_LANG, dpi=None, psm=None):
+    """用目前的 OCR 引擎辨識圖片，不經過快取；psm 可指定版面分析模式"""
+    if get_ocr_backend() == 'tesserocr':
+        import tesserocr
+
+        api = _get_tesserocr_api(lang)
+        api.SetPageSegMode(psm if psm is not None else tesserocr.PSM.AUTO)
+        try:
+            api.SetImage(image)
+            if dpi:
+                api.SetSourceResolution(int(dpi[0] if isinstance(dpi, tuple) else dpi))
+            return api.GetUTF8Text()
+        finally:
+            api.SetPageSegMode(tesserocr.PSM.AUTO)
+    config = f'--psm {psm}' if psm is not None else ''
+    return pytesseract.image_to_string(image, lang=lang, config=config)
+
+
+def ocr_words(image, lang=OCR_LANG, dpi=None, psm=None):
+    """
+    辨識圖片並回傳每個字詞的位置與信心度
+
+    每個字詞為字典，欄位與 Tesseract TSV 輸出相同：
+    block_num、par_num、line_num、word_num、left、top、width、height、conf、text。
+    psm 可指定版面分析模式，例如 7 表示整張圖只有一行文字。
+    """
+    if get_ocr_backend() == 'tesserocr':
+        return _tesserocr_words(image, lang, dpi, psm)
+
+    config = f'--psm {psm}' if psm is not None else ''
+    if dpi:
+        config += f' --dpi {int(dpi[0] if isinstance(dpi, tuple) else dpi)}'
+    data = pytesseract.image_to_data(image, lang=lang, config=config.strip(),
+                                     output_type=pytesseract.Output.DICT)
+    words = []
+    for i, text in enumerate(data['text']):
+        if data['level'][i] != 5 or not text.strip():
+            continue
+        words.append({key: data[key][i] for key in ('block_num', 'par_num', 'line_num', 'word_num',
+                                                    'left', 'top', 'width', 'height')})
+        words[-1].update(conf=float(data['conf'][i]), text=text.strip())
+    return words
+
+
+def _tesserocr_words(image, lang, dpi, psm):
+    """以 tesserocr 的結果迭代器逐字取出位置與信心度"""
+    import tesserocr
+
+    api = _get_tesserocr_api(lang)
+    api.SetPageSegMode(psm if psm is not None else tesserocr.PSM.AUTO)
+    try:
+        api.SetImage(image)
+        if dpi:
+            api.SetSourceResolution(int(dpi[0] if isinstance(dpi, tuple) else dpi))
+        api.Recognize()
+        iterator = api.GetIterator()
+        words = []
+        if iterator is None:
+            return words
+
+        RIL = tesserocr.RIL
+        block = par = line = word = 0
+        for result in tesserocr.iterate_level(iterator, RIL.WORD):
+            if result.IsAtBeginningOf(RIL.BLOCK):
+                block, par, line = block + 1, 0, 0
+            if result.IsAtBeginningOf(RIL.PARA):
+                par, line = par + 1, 0
+            if result.IsAtBeginningOf(RIL.TEXTLINE):
+                line, word = line + 1, 0
+            word += 1
+            text = (result.GetUTF8Text(RIL.WORD) or '').strip()
+            box = result.BoundingBox(RIL.WORD)
+            if not text or box is None:
+                continue
+            left, top, right, bottom = box
+            words.append({'block_num': block, 'par_num': par, 'line_num': line, 'word_num': word,
+                          'left': left, 'top': top, 'width': right - left, 'height': bottom - top,
+                          'conf': float(result.Confidence(RIL.WORD)), 'text': text})
+        return words
+    finally:
+        api.SetPageSegMode(tesserocr.PSM.AUTO)
+
+
+def _is_cjk(char):
+    return '\u3000' <= char <= '\u9fff' or '\uf900' <= char <= '\ufaff' or '\uff00' <= char <= '\uffef'
+
+
+def group_lines(words):
+    """
+    把字詞依 (區塊, 段落, 行) 分組，回傳每行的字典：
+    key、words、text、conf（平均信心度）、bbox（左, 上, 右, 下）
+    """
+    lines = []
+    for word in words:
+        key = (word['block_num'], word['par_num'], word['line_num'])
+        if not lines or lines[-1]['key'] != key:
+            lines.append({'key': key, 'words': []})
+        lines[-1]['words'].append(word)
+
+    for line in lines:
+        text = ''
+        for word in line['words']:
+            # 中文字之間不加空白，其他文字以空白分隔
+            if text and not (_is_cjk(text[-1]) and _is_cjk(word['text'][0])):
+                text += ' '
+            text += word['text']
+        line['text'] = text
+        line['conf'] = sum(word['conf'] for word in line['words']) / len(line['words'])
+        line['bbox'] = (min(word['left'] for word in line['words']),
+                        min(word['top'] for word in line['words']),
+                        max(word['left'] + word['width'] for word in line['words']),
+                        max(word['top'] + word['height'] for word in line['words']))
+    return lines
+
+
+def lines_to_text(lines):
+    """各行以換行連接，不同段落之間空一行"""
+    parts = []
+    previous = None
+    for line in lines:
+        if previous is not None:
+            parts.append('\n\n' if line['key'][:2] != previous else '\n')
+        parts.append(line['text'])
+        previous = line['key'][:2]
+    return ''.join(parts)
+
+
+def _preprocess(image, dpi, timings, stages=None):
+    """影像前處理，numpy 只在需要時載入"""
+    try:
+        from src.ocr_preprocess import PREPROCESS_STAGES, preprocess_image
+    except ImportError:
+        raise ImportError("影像前處理需要 numpy，請先執行: pip install numpy")
+    return preprocess_image(image, dpi, stages=stages or PREPROCESS_STAGES, timings=timings)
+
+
+def _preprocess_and_ocr(image, lang, dpi, preprocess, timings):
+    """需要時先做影像前處理再辨識"""
+    if preprocess:
+        image, dpi = _preprocess(image, dpi, timings)
+    return run_ocr(image, lang, dpi)
+
+
+def _cached_ocr(image, lang, dpi, use_cache, tag, compute):
+    """以圖片內容查快取，沒有時呼叫 compute() 辨識並存入"""
+    if not use_cache:
+        return compute()
+    key = cache_key(image, lang, dpi, get_tesseract_version() + tag)
+    text = get_cached_text(key)
+    if text is None:
+        text = compute()
+        put_cached_text(key, text)
+    return text
+
+
+def ocr_image(image, lang=OCR_LANG, dpi=None, use_cache=True, preprocess=False, timings=None):
+    """
+    辨識單張圖片的文字
+
+    preprocess 為 True 時先做灰階、二值化、傾斜校正等前處理，
+    各步驟耗時累加到 timings 字典。
+    相同像素、語言、解析度與 Tesseract 版本的結果會存在快取中，重跑時直接取用。
+    """
+    return _cached_ocr(image, lang, dpi, use_cache, '+preprocess' if preprocess else '',
+                       lambda: _preprocess_and_ocr(image, lang, dpi, preprocess, timings))
+
+
+def ocr_adaptive(fast_image, load_accurate_image, lang=OCR_LANG, fast_dpi=FAST_DPI,
+                 accurate_dpi=ACCURATE_DPI, preprocess=False, timings=None):
+    """
+    兩段式辨識，回傳 (文字, 方式)，方式為 'fast'、'lines' 或 'page'
+
+    先辨識低解析度的 fast_image；整頁平均信心度夠高且沒有低信心度的行就直接採用。
+    否則呼叫 load_accurate_image() 取得高解析度圖片：低信心度的行不多時只裁切這些行
+    以單行模式重新辨識，信心度較高才取代；太多、完全辨識不出文字，或整頁信心度偏低
+    但沒有單獨偏低的行時整頁重新辨識。
+    """
+    scale = accurate_dpi / fast_dpi
+    if preprocess:
+        fast_image, _ = _preprocess(fast_image, fast_dpi, timings, ADAPTIVE_PREPROCESS_STAGES)
+
+    words = ocr_words(fast_image, lang, fast_dpi)
+    lines = group_lines(words)
+    page_conf = sum(word['conf'] for word in words) / len(words) if words else 0
+    low_lines = [line for line in lines if line['conf'] < MIN_LINE_CONFIDENCE]
+    if words and page_conf >= MIN_PAGE_CONFIDENCE and not low_lines:
+        return lines_to_text(lines), 'fast'
+
+    accurate_image = load_accurate_image()
+    if preprocess:
+        accurate_image, _ = _preprocess(accurate_image, accurate_dpi, timings, ADAPTIVE_PREPROCESS_STAGES)
+
+    # 每一行都只是略低於整頁門檻時，沒有可以單獨重新辨識的行
+    if not low_lines or len(low_lines) > len(lines) * WHOLE_PAGE_RATIO:
+        return lines_to_text(group_lines(ocr_words(accurate_image, lang, accurate_dpi))), 'page'
+
+    width, height = accurate_image.size
+    for line in low_lines:
+        left, top, right, bottom = line['bbox']
+        box = (max(0, int(left * scale) - LINE_PADDING), max(0, int(top * scale) - LINE_PADDING),
+               min(width, int(right * scale) + LINE_PADDING), min(height, int(bottom * scale) + LINE_PADDING))
+        region_words = ocr_words(accurate_image.crop(box), lang, accurate_dpi, psm=7)
+        if not region_words:
+            continue
+        region_conf = sum(word['conf'] for word in region_words) / len(region_words)
+        if region_conf > line['conf']:
+            region = group_lines(region_words)
+            line['text'] = ' '.join(region_line['text'] for region_line in region)
+            line['conf'] = region_conf
+    return lines_to_text(lines), 'lines'
+
+
+def ocr_image_adaptive(image, lang=OCR_LANG, dpi=None, use_cache=True, preprocess=False, timings=None):
+    """
+    單張圖片的兩段式辨識
+
+    大圖先縮小到一半快速辨識，需要時再用原圖；小圖直接快速辨識，需要時放大兩倍重新辨識。
+    """
+    scale = ACCURATE_DPI / FAST_DPI
+    if max(image.size) >= 2000:
+        fast_image = image.resize((round(image.width / scale), round(image.height / scale)), Image.LANCZOS)
+
+        def load_accurate_image():
+            return image
+    else:
+        fast_image = image
+
+        def load_accurate_image():
+            return image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+
+    def compute():
+        text, mode = ocr_adaptive(fast_image, load_accurate_image, lang, preprocess=preprocess, timings=timings)
+        if mode != 'fast':
+            print(f"信心度偏低，已以較高解析度重新辨識（{'整張' if mode == 'page' else '部分文字行'}）")
+        return text
+
+    tag = f'+adaptive{FAST_DPI}-{ACCURATE_DPI}' + ('+preprocess' if preprocess else '')
+    return _cached_ocr(image, lang, dpi, use_cache, tag, compute)
+
+
+def ocr_pdf_page_adaptive(file_path, page_number, page, lang=OCR_LANG, use_cache=True,
+                          preprocess=False, timings=None):
+    """PDF 單頁的兩段式辨識，page 為 FAST_DPI 轉出的圖片，需要時才以 ACCURATE_DPI 重新轉換該頁"""
+    def load_accurate_image():
+        return convert_from_path(file_path, dpi=ACCURATE_DPI, first_page=page_number, last_page=page_number)[0]
+
+    def compute():
+        text, mode = ocr_adaptive(page, load_accurate_image, lang, preprocess=preprocess, timings=timings)
+        if mode != 'fast':
+            print(f"第 {page_number} 頁信心度偏低，已以 {ACCURATE_DPI} DPI 重新辨識"
+                  f"（{'整頁' if mode == 'page' else '部分文字行'}）")
+        return text
+
+    tag = f'+adaptive{ACCURATE_DPI}' + ('+preprocess' if preprocess else '')
+    return _cached_ocr(page, lang, FAST_DPI, use_cache, tag, compute)
+
+
+def print_preprocess_timings(timings):
+    """顯示影像前處理各步驟的耗時"""
+    if timings:
+        total = sum(timings.values())
+        steps = '，'.join(f"{stage} {seconds:.2f} 秒" for stage, seconds in timings.items())
+        print(f"前處理耗時 {total:.2f} 秒（{steps}）")
+
+
+_region_executors = {}
+_region_executors_lock = threading.Lock()
+
+
+def _get_region_executor(workers):
+    """
+    取得長駐的區塊辨識執行緒池，同樣大小的池在整個行程中只建立一次
+
+    tesserocr 引擎存在各執行緒中，重複使用同一批執行緒，語言資料才只需載入一次。
+    """
+    with _region_executors_lock:
+        executor = _region_executors.get(workers)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr-region')
+            _region_executors[workers] = executor
+        return executor
+
+
+def ocr_image_layout(image, lang=OCR_LANG, dpi=None, use_cache=True, preprocess=False, timings=None,
+                     workers=1):
+    """
+    依版面分區辨識
+
+    先找出文字區塊，略過空白與照片、圖形，每個區塊依類型（段落、單行、直書）
+    選擇版面模式，交給執行緒池同時辨識，再依閱讀順序組合，區塊之間空一行。
+    """
+    def compute():
+        try:
+            from src.ocr_layout import find_text_regions, region_psm
+        except ImportError:
+            raise ImportError("版面分析需要 numpy，請先執行: pip install numpy")
+
+        page, page_dpi = _preprocess(image, dpi, timings) if preprocess else (image, dpi)
+        regions = find_text_regions(page, page_dpi)
+
+        def recognize(region):
+            left, top, right, bottom, kind = region
+            # 四周補一點白邊，Tesseract 對貼齊邊緣的文字辨識較差
+            crop = ImageOps.expand(page.crop((left, top, right, bottom)), border=10, fill='white')
+            return run_ocr(crop, lang, page_dpi, psm=region_psm(kind)).strip()
+
+        if workers > 1:
+            texts = list(_get_region_executor(workers).map(recognize, regions))
+        else:
+            texts = [recognize(region) for region in regions]
+        return '\n\n'.join(text for text in texts if text)
+
+    tag = '+layout' + ('+preprocess' if preprocess else '')
+    return _cached_ocr(image, lang, dpi, use_cache, tag, compute)
+
+
+def scan_image(file_path, preprocess=False, adaptive=False, layout=False, workers=1):
+    """
+    處理圖片文件的文字辨識
+
+    adaptive 為 True 時使用兩段式辨識；layout 為 True 時依版面分區辨識（優先於兩段式），
+    workers 為同時辨識的區塊數。
+    """
     try:
         # 開啟並預處理圖片
         image = Image.open(file_path)
 
         # 嘗試進行文字辨識
-        text = pytesseract.image_to_string(image, lang='chi_tra+eng')
+        timings = {}
+        dpi = image.info.get('dpi')
+        if layout:
+            text = ocr_image_layout(image, dpi=dpi, preprocess=preprocess, timings=timings, workers=workers)
+        elif adaptive:
+            text = ocr_image_adaptive(image, dpi=dpi, preprocess=preprocess, timings=timings)
+        else:
+            text = ocr_image(image, dpi=dpi, preprocess=preprocess, timings=timings)
+        print_preprocess_timings(timings)
+        text = correct_text(text)
 
         if not text.strip():
             print(f"警告: {file_path} 未能識別出任何文字")
@@ -41,18 +475,177 @@ def scan_image(file_path):
         return f"錯誤: {str(e)}"
 
 
-def scan_pdf(file_path):
-    """處理PDF文件的文字辨識"""
+def get_pdf_page_count(file_path):
+    """取得 PDF 頁數"""
+    return pdfinfo_from_path(file_path)['Pages']
+
+
+def iter_pdf_pages(file_path, first_page=1, last_page=None, dpi=PDF_DPI, window=PAGE_WINDOW):
+    """
+    逐頁產生 (頁碼, 圖片)
+
+    每次只轉換 window 頁，呼叫端處理完一頁後圖片即被釋放，
+    因此不論文件多長，記憶體中最多只有 window 頁的圖片。
+    """
+    if last_page is None:
+        last_page = get_pdf_page_count(file_path)
+
+    for start in range(first_page, last_page + 1, window):
+        end = min(start + window - 1, last_page)
+        pages = convert_from_path(file_path, dpi=dpi, first_page=start, last_page=end)
+        page_number = start
+        while pages:
+            page = pages.pop(0)
+            yield page_number, page
+            page.close()
+            page_number += 1
+
+
+def is_usable_text(text):
+    """
+    判斷內嵌文字是否可用
+
+    掃描檔常只有零星幾個字或完全沒有文字；字型缺少對照表時，
+    抽出的文字會變成替代字元、私用區字元或控制字元，這些都算不可辨認。
+    """
+    chars = [c for c in text if not c.isspace()]
+    if len(chars) < MIN_TEXT_CHARS:
+        return False
+    readable = sum(1 for c in chars
+                   if c != '\ufffd' and unicodedata.category(c) not in ('Cc', 'Co', 'Cn'))
+    return readable / len(chars) >= MIN_GLYPH_COVERAGE
+
+
+def extract_text_layer(file_path):
+    """
+    逐頁取出 PDF 內嵌的文字，回傳每頁文字的串列
+
+    需要 pypdf；沒有安裝或無法讀取時回傳 None，由呼叫端全部改用 OCR。
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        print("未安裝 pypdf，所有頁面都會使用 OCR（pip install pypdf）")
+        return None
+
+    try:
+        reader = PdfReader(file_path)
+        texts = []
+        for page in reader.pages:
+            try:
+                texts.append(page.extract_text() or '')
+            except Exception:
+                texts.append('')
+        return texts
+    except Exception as e:
+        print(f"無法讀取內嵌文字，改用 OCR: {str(e)}")
+        return None
+
+
+def _page_windows(page_numbers):
+    """把頁碼分成連續且不超過 PAGE_WINDOW 頁的區段 [(起始頁, 結束頁)]"""
+    windows = []
+    for page_number in page_numbers:
+        if (windows and windows[-1][1] == page_number - 1
+                and page_number - windows[-1][0] < PAGE_WINDOW):
+            windows[-1] = (windows[-1][0], page_number)
+        else:
+            windows.append((page_number, page_number))
+    return windows
+
+
+def _init_ocr_worker():
+    """每個工作行程的 Tesseract 只用一個執行緒，避免多個行程互搶 CPU"""
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    # fork 出來的行程會繼承主行程的 SQLite 連線，不能共用，改為各自重新開啟
+    ocr_cache._connection = None
+
+
+def _iter_ocr_pages(file_path, first_page, last_page, lang, preprocess, adaptive, timings):
+    """轉換並辨識一段連續頁面，產生 (頁碼, 文字)；兩段式辨識時先以 FAST_DPI 轉換"""
+    dpi = FAST_DPI if adaptive else PDF_DPI
+    for page_number, page in iter_pdf_pages(file_path, first_page, last_page, dpi=dpi):
+        if adaptive:
+            text = ocr_pdf_page_adaptive(file_path, page_number, page, lang,
+                                         preprocess=preprocess, timings=timings)
+        else:
+            text = ocr_image(page, lang, PDF_DPI, preprocess=preprocess, timings=timings)
+        yield page_number, text
+
+
+def _ocr_pdf_window(file_path, first_page, last_page, lang, preprocess, adaptive):
+    """在工作行程中辨識一段連續頁面，回傳 ([(頁碼, 文字)], 前處理耗時)"""
+    timings = {}
+    results = list(_iter_ocr_pages(file_path, first_page, last_page, lang, preprocess, adaptive, timings))
+    return results, timings
+
+
+def _iter_ocr_windows(file_path, windows, lang, workers, page_count, preprocess, adaptive, timings):
+    """依頁碼順序辨識各區段的頁面，產生 (頁碼, 文字)，前處理耗時累加到 timings"""
+    if workers <= 1:
+        for first_page, last_page in windows:
+            for page_number, text in _iter_ocr_pages(file_path, first_page, last_page, lang,
+                                                     preprocess, adaptive, timings):
+                print(f"已完成第 {page_number}/{page_count} 頁")
+                yield page_number, text
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker) as executor:
+        futures = [executor.submit(_ocr_pdf_window, file_path, first_page, last_page, lang, preprocess, adaptive)
+                   for first_page, last_page in windows]
+        for future in futures:
+            results, window_timings = future.result()
+            for stage, seconds in window_timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+            for page_number, text in results:
+                print(f"已完成第 {page_number}/{page_count} 頁")
+                yield page_number, text
+
+
+def iter_scan_pdf(file_path, lang=OCR_LANG, workers=1, use_text_layer=True, preprocess=False, adaptive=False):
+    """
+    逐頁辨識 PDF，依頁碼順序產生 (頁碼, 文字)
+
+    use_text_layer 為 True 時，有可用內嵌文字的頁面直接使用內嵌文字，
+    只有其餘頁面才轉成圖片辨識。
+    preprocess 為 True 時辨識前先做影像前處理，全部完成後顯示各步驟耗時。
+    adaptive 為 True 時先以低解析度快速辨識，只有信心度不足的頁面或文字行才以高解析度重新辨識。
+    workers 大於 1 時，每 PAGE_WINDOW 頁為一份工作交給行程池同時辨識，
+    各工作行程自行轉換該段頁面，結果仍依頁碼順序產生。
+    """
+    text_layer = extract_text_layer(file_path) if use_text_layer else None
+    if text_layer is None:
+        page_count = get_pdf_page_count(file_path)
+        native = {}
+    else:
+        page_count = len(text_layer)
+        native = {page_number: text for page_number, text in enumerate(text_layer, 1)
+                  if is_usable_text(text)}
+        if native:
+            print(f"{len(native)}/{page_count} 頁使用內嵌文字")
+
+    ocr_pages = [page_number for page_number in range(1, page_count + 1)
+                 if page_number not in native]
+    timings = {}
+    ocr_results = _iter_ocr_windows(file_path, _page_windows(ocr_pages), lang, workers, page_count,
+                                    preprocess, adaptive, timings)
+    for page_number in range(1, page_count + 1):
+        if page_number in native:
+            yield page_number, native[page_number]
+        else:
+            yield next(ocr_results)
+    print_preprocess_timings(timings)
+
+
+def scan_pdf(file_path, workers=1, use_text_layer=True, preprocess=False, adaptive=False):
+    """處理PDF文件的文字辨識，workers 大於 1 時多頁同時辨識，有內嵌文字的頁面不做 OCR"""
     try:
-        # 將PDF轉換為圖片
-        pages = convert_from_path(file_path)
         text_result = []
 
-        # 處理每一頁
-        for i, page in enumerate(pages):
-            print(f"正在處理第 {i + 1} 頁...")
-            text = pytesseract.image_to_string(page, lang='chi_tra+eng')
-            text_result.append(f"=== 第 {i + 1} 頁 ===\n{text}\n")
+        # 一次只轉換少數頁面，辨識完就釋放圖片
+        for page_number, text in iter_scan_pdf(file_path, workers=workers, use_text_layer=use_text_layer,
+                                                  preprocess=preprocess, adaptive=adaptive):
+            text_result.append(f"=== 第 {page_number} 頁 ===\n{correct_text(text)}\n")
 
         return '\n'.join(text_result)
     except Exception as e:
@@ -60,6 +653,166 @@ def scan_pdf(file_path):
         return f"錯誤: {str(e)}"
 
 
+def scan_file(file_path, workers=1, preprocess=False, adaptive=False, layout=False):
+    """依副檔名辨識圖片或 PDF，不支援的格式回傳 None；layout 只用於圖片"""
+    if file_path.lower().endswith(IMAGE_EXTENSIONS):
+        return scan_image(file_path, preprocess, adaptive, layout, workers)
+    if file_path.lower().endswith('.pdf'):
+        return scan_pdf(file_path, workers, preprocess=preprocess, adaptive=adaptive)
+    return None
+
+
+def scan_files(file_paths, workers=OCR_WORKERS, preprocess=False, adaptive=False, layout=False):
+    """
+    同時辨識多個檔案，每完成一個就產生 (file_path, 結果文字)，順序為完成順序
+
+    多個檔案時以檔案為單位分給行程池；只有一個檔案時改為同一檔案的多頁同時辨識。
+    """
+    if len(file_paths) == 1 or workers <= 1:
+        for file_path in file_paths:
+            yield file_path, scan_file(file_path, workers, preprocess, adaptive, layout)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker) as executor:
+        futures = {executor.submit(scan_file, file_path, 1, preprocess, adaptive, layout): file_path for file_path in file_paths}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def make_searchable_pdf(file_path, output_path, lang=OCR_LANG, dpi=PDF_DPI, single_thread=False):
+    """
+    產生可搜尋的 PDF：保留原始頁面影像，上面疊一層看不見的文字
+
+    PDF 先逐頁轉成 JPEG 暫存檔（不載入記憶體），再把檔案清單交給 Tesseract 的 PDF 輸出，
+    Tesseract 辨識完一頁就寫入一頁，因此記憶體用量與頁數無關。
+    回傳 (success, 訊息)。
+    """
+    output_base = os.path.splitext(output_path)[0]
+    env = dict(os.environ, OMP_THREAD_LIMIT='1') if single_thread else None
+    try:
+        with tempfile.TemporaryDirectory(prefix='picscan_') as temp_dir:
+            if file_path.lower().endswith('.pdf'):
+                page_count = get_pdf_page_count(file_path)
+                page_paths = []
+                for start in range(1, page_count + 1, PAGE_WINDOW):
+                    end = min(start + PAGE_WINDOW - 1, page_count)
+                    page_paths += convert_from_path(file_path, dpi=dpi, first_page=start, last_page=end,
+                                                    fmt='jpeg', output_folder=temp_dir, paths_only=True)
+                    print(f"已轉換第 {end}/{page_count} 頁")
+                input_path = os.path.join(temp_dir, 'pages.txt')
+                with open(input_path, 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(page_paths) + '\n')
+                dpi_option = ['--dpi', str(dpi)]
+            else:
+                input_path = file_path
+                dpi_option = []
+
+            command = [pytesseract.pytesseract.tesseract_cmd, input_path, output_base,
+                       '-l', lang, *dpi_option, 'pdf']
+            result = subprocess.run(command, capture_output=True, text=True, env=env)
+            if result.returncode != 0:
+                return False, f"Tesseract 錯誤: {result.stderr.strip()}"
+        return True, output_base + '.pdf'
+    except Exception as e:
+        return False, f"產生可搜尋 PDF 時發生錯誤: {str(e)}"
+
+
+def make_searchable_pdfs(file_paths, output_folder, workers=OCR_WORKERS):
+    """
+    同時為多個檔案產生可搜尋 PDF（output_<檔名>.pdf），每完成一個就產生 (file_path, success, 結果)
+
+    實際工作在 tesseract 子行程中進行，因此用執行緒池即可平行處理。
+    """
+    def build(file_path):
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        output_path = os.path.join(output_folder, f"output_{name}.pdf")
+        return make_searchable_pdf(file_path, output_path, single_thread=workers > 1)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(build, file_path): file_path for file_path in file_paths}
+        for future in as_completed(futures):
+            success, result = future.result()
+            yield futures[future], success, result
+
+
+WORD_COLUMNS = ('block_num', 'par_num', 'line_num', 'word_num', 'left', 'top', 'width', 'height', 'conf', 'text')
+
+
+def write_word_table(file_path, output_path, lang=OCR_LANG, dpi=PDF_DPI):
+    """
+    把每個辨識出的字詞連同頁碼、位置、信心度與區塊/段落/行編號寫成欄式檔案
+
+    副檔名為 .parquet 時寫成 Parquet，否則寫成 Arrow IPC。需要 pyarrow。
+    每頁寫入一批，PDF 逐頁轉換，記憶體中只有一頁的資料。
+    座標以像素計，PDF 頁面的解析度記錄在檔案的 metadata 中。回傳 (success, 訊息)。
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return False, "逐字位置表需要 pyarrow，請先執行: pip install pyarrow"
+
+    is_pdf = file_path.lower().endswith('.pdf')
+    fields = [pa.field('page', pa.int32())]
+    fields += [pa.field(name, pa.int32()) for name in WORD_COLUMNS[:8]]
+    fields += [pa.field('conf', pa.float32()), pa.field('text', pa.string())]
+    metadata = {'source': os.path.basename(file_path), 'lang': lang}
+    if is_pdf:
+        metadata['dpi'] = str(dpi)
+    schema = pa.schema(fields, metadata=metadata)
+
+    try:
+        if output_path.lower().endswith('.parquet'):
+            import pyarrow.parquet as pq
+            writer = pq.ParquetWriter(output_path, schema, compression='zstd')
+        else:
+            writer = pa.ipc.new_file(output_path, schema)
+
+        word_count = 0
+        with writer:
+            if is_pdf:
+                pages = iter_pdf_pages(file_path, dpi=dpi)
+            else:
+                image = Image.open(file_path)
+                dpi = image.info.get('dpi')
+                pages = [(1, image)]
+
+            for page_number, page in pages:
+                words = ocr_words(page, lang, dpi)
+                if not words:
+                    continue
+                columns = {'page': [page_number] * len(words)}
+                columns.update({name: [word[name] for word in words] for name in WORD_COLUMNS})
+                writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+                word_count += len(words)
+                if is_pdf:
+                    print(f"已完成第 {page_number} 頁")
+        return True, f"{output_path}（{word_count} 個字詞）"
+    except Exception as e:
+        return False, f"寫入逐字位置表時發生錯誤: {str(e)}"
+
+
+def _write_word_table_in_folder(file_path, output_folder, extension):
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return write_word_table(file_path, os.path.join(output_folder, f"output_{name}{extension}"))
+
+
+def write_word_tables(file_paths, output_folder, extension='.parquet', workers=OCR_WORKERS):
+    """
+    同時為多個檔案寫出逐字位置表（output_<檔名>.parquet 或 .arrow），
+    每完成一個就產生 (file_path, success, 結果)
+    """
+    if len(file_paths) == 1 or workers <= 1:
+        for file_path in file_paths:
+            yield (file_path, *_write_word_table_in_folder(file_path, output_folder, extension))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker) as executor:
+        futures = {executor.submit(_write_word_table_in_folder, file_path, output_folder, extension): file_path
+                   for file_path in file_paths}
+        for future in as_completed(futures):
+            yield (futures[future], *future.result())
+
+
 def main():
     # 檢查 Tesseract 安裝
     if not check_tesseract():
@@ -79,30 +832,27 @@ def main():
         print(f"錯誤: 在 {desktop_path} 中沒有找到任何文件")
         return
 
-    # 處理資料夾中的所有文件
+    # 跳過輸出文件與不支援的格式
+    file_paths = []
     for filename in files:
-        file_path = os.path.join(desktop_path, filename)
-
-        # 跳過輸出文件
         if filename.startswith('output_'):
             continue
-
-        print(f"\n開始處理: {filename}")
-
-        # 根據文件類型進行處理
-        if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
-            result = scan_image(file_path)
-        elif filename.lower().endswith('.pdf'):
-            result = scan_pdf(file_path)
-        else:
+        if not filename.lower().endswith(IMAGE_EXTENSIONS + ('.pdf',)):
             print(f"不支援的文件格式: {filename}")
             continue
+        file_paths.append(os.path.join(desktop_path, filename))
+
+    # 同時處理多個文件，完成一個存一個
+    print(f"\n開始處理 {len(file_paths)} 個文件...")
+    for file_path, result in scan_files(file_paths):
+        filename = os.path.basename(file_path)
 
         # 將結果寫入文字檔
         output_file = os.path.join(desktop_path, f"output_{os.path.splitext(filename)[0]}.txt")
         try:
             with open(output_file, 'w', encoding='utf-8') as f:
                 f.write(result)
+            index_output(output_file)
             print(f"處理完成: {filename}")
             print(f"結果已保存到: {output_file}")
         except Exception as e:
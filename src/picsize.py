@@ -5,6 +5,11 @@ import os
 import threading
 
 
+def save_compressed_image(img, output, quality, format=None):
+    """以指定品質儲存圖片，output 可以是路徑或檔案物件（此時需指定 format）"""
+    img.save(output, format=format, quality=quality, optimize=True)
+
+
 class ImageCompressorGUI:
     def __init__(self, root):
         self.root = root
@@ -73,7 +78,7 @@ class ImageCompressorGUI:
 
     def compress_image(self, image_path, output_path, quality):
         with Image.open(image_path) as img:
-            img.save(output_path, quality=quality, optimize=True)
+            save_compressed_image(img, output_path, quality)
 
     def update_status(self, message):
         self.status_text.insert(tk.END, message + "\n")
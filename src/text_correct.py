@@ -0,0 +1,136 @@
+import json
+import os
+import re
+import threading
+
+# 錯字對照表：{"錯誤寫法": "正確寫法"}，修改後下次校正時自動重新載入
+CORRECTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'wrong_chars.json')
+
+_TERMINAL = ''
+
+
+class TextCorrector:
+    """
+    依對照表一次掃過文字完成所有替換
+
+    比對規則為「最左最長」：從左往右找，同一位置有多個詞時取最長的，
+    替換後從詞尾繼續，因此「干擾→干擾」這類對照可以保護較短的「干→乾」不被誤換。
+    有安裝 pyahocorasick 時使用其 C 實作的 Aho-Corasick 自動機；
+    否則使用字典樹，並先以正規表示式跳到可能的詞首，不是詞首的文字整段複製。
+    """
+
+    def __init__(self, mapping):
+        self.mapping = {wrong: right for wrong, right in mapping.items() if wrong and wrong != right}
+        # 相同寫法的對照不替換，但仍要參與比對，才能擋住較短的詞
+        protected = {wrong for wrong, right in mapping.items() if wrong and wrong == right}
+        self._automaton = None
+        self._trie = None
+
+        try:
+            import ahocorasick
+        except ImportError:
+            ahocorasick = None
+
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for wrong in protected:
+                automaton.add_word(wrong, (len(wrong), wrong))
+            for wrong, right in self.mapping.items():
+                automaton.add_word(wrong, (len(wrong), right))
+            if len(automaton):
+                automaton.make_automaton()
+                self._automaton = automaton
+            return
+
+        trie = {}
+        for wrong, right in [(word, word) for word in protected] + list(self.mapping.items()):
+            node = trie
+            for char in wrong:
+                node = node.setdefault(char, {})
+            node[_TERMINAL] = right
+        self._trie = trie
+        if trie:
+            self._starts = re.compile('[' + ''.join(re.escape(char) for char in trie) + ']')
+
+    def correct(self, text):
+        """回傳校正後的文字"""
+        if self._automaton is not None:
+            return self._correct_automaton(text)
+        if self._trie:
+            return self._correct_trie(text)
+        return text
+
+    def _correct_automaton(self, text):
+        parts = []
+        position = 0
+        for end, (length, replacement) in self._automaton.iter_long(text):
+            start = end - length + 1
+            parts.append(text[position:start])
+            parts.append(replacement)
+            position = end + 1
+        parts.append(text[position:])
+        return ''.join(parts)
+
+    def _correct_trie(self, text):
+        parts = []
+        position = 0
+        search = self._starts.search
+        trie = self._trie
+        length = len(text)
+        match = search(text, position)
+        while match:
+            start = match.start()
+            node = trie
+            index = start
+            best_end = -1
+            best = None
+            while index < length:
+                node = node.get(text[index])
+                if node is None:
+                    break
+                index += 1
+                if _TERMINAL in node:
+                    best_end, best = index, node[_TERMINAL]
+            if best is None:
+                match = search(text, start + 1)
+                continue
+            parts.append(text[position:start])
+            parts.append(best)
+            position = best_end
+            match = search(text, position)
+        parts.append(text[position:])
+        return ''.join(parts)
+
+
+_lock = threading.Lock()
+_corrector = None
+_loaded_mtime = None
+
+
+def get_corrector():
+    """取得目前對照表的校正器；對照表檔案有更新時重新編譯"""
+    global _corrector, _loaded_mtime
+    try:
+        mtime = os.stat(CORRECTIONS_PATH).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    with _lock:
+        if _corrector is None or mtime != _loaded_mtime:
+            mapping = {}
+            if mtime is not None:
+                try:
+                    with open(CORRECTIONS_PATH, encoding='utf-8') as f:
+                        mapping = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"讀取錯字對照表失敗: {str(e)}")
+                    if _corrector is not None:
+                        return _corrector
+            _corrector = TextCorrector(mapping)
+            _loaded_mtime = mtime
+        return _corrector
+
+
+def correct_text(text):
+    """依 config/wrong_chars.json 校正錯字"""
+    return get_corrector().correct(text)
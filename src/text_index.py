@@ -0,0 +1,277 @@
+import argparse
+import os
+import re
+import sqlite3
+import time
+
+# 全文索引檔位置，與 OCR 快取放在同一個資料夾
+INDEX_PATH = os.path.expanduser("~/.picscan/text_index.sqlite")
+
+# 會被索引的輸出檔：picscan 的 output_*.txt 與轉錄工具的 *_transcript.txt
+INDEX_PATTERNS = (re.compile(r'^output_.*\.txt$'), re.compile(r'.*_transcript\.txt$'))
+
+# 工具寫出結果的資料夾：(資料夾, 是否包含子資料夾)；轉錄檔直接放在桌面，不掃描桌面底下的其他資料夾
+OUTPUT_FOLDERS = (
+    (os.path.expanduser("~/Desktop/picscan"), True),
+    (os.path.expanduser("~/Desktop"), False),
+)
+
+SNIPPET_CHARS = 30
+
+PAGE_MARKER = re.compile(r'^=== 第 (\d+) 頁 ===$', re.MULTILINE)
+CJK_RUN = re.compile(r'[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+')
+WORD = re.compile(r'[^\W㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+')
+
+
+def _cjk_tokens(run):
+    """
+    中日韓文字切成相鄰兩字一組，並在最後補上單字
+
+    「臺灣大學」會變成 臺灣 灣大 大學 學，查詢多字詞時用片語比對相鄰的兩字組，
+    查詢單字時用前綴比對，兩者都找得到。
+    """
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+
+
+def tokenize(text):
+    """把文字轉成以空白分隔的索引詞：中日韓文字用兩字組，其他文字用小寫單字"""
+    tokens = []
+    position = 0
+    for match in CJK_RUN.finditer(text):
+        tokens += [word.lower() for word in WORD.findall(text[position:match.start()])]
+        tokens += _cjk_tokens(match.group())
+        position = match.end()
+    tokens += [word.lower() for word in WORD.findall(text[position:])]
+    return ' '.join(tokens)
+
+
+def build_match_query(query):
+    """把使用者輸入的查詢轉成 FTS5 語法，每段文字都必須出現"""
+    parts = []
+    position = 0
+    for match in CJK_RUN.finditer(query):
+        parts += [f'"{word.lower()}"' for word in WORD.findall(query[position:match.start()])]
+        run = match.group()
+        if len(run) == 1:
+            parts.append(f'"{run}"*')
+        else:
+            parts.append('"' + ' '.join(run[i:i + 2] for i in range(len(run) - 1)) + '"')
+        position = match.end()
+    parts += [f'"{word.lower()}"' for word in WORD.findall(query[position:])]
+    return ' AND '.join(parts)
+
+
+_connection = None
+
+
+def _get_connection():
+    """開啟索引檔，第一次使用時建立資料表"""
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+        _connection = sqlite3.connect(INDEX_PATH, timeout=30, check_same_thread=False)
+        _connection.execute("PRAGMA journal_mode=WAL")
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "path TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        _connection.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+            "path UNINDEXED, location UNINDEXED, content UNINDEXED, tokens)"
+        )
+        _connection.commit()
+    return _connection
+
+
+def split_pages(text):
+    """依 picscan 的頁面標記切開文字，回傳 [(位置, 文字)]；沒有標記時依段落切開並標示行號"""
+    markers = list(PAGE_MARKER.finditer(text))
+    if markers:
+        chunks = []
+        for marker, next_marker in zip(markers, markers[1:] + [None]):
+            end = next_marker.start() if next_marker else len(text)
+            chunks.append((f"第 {marker.group(1)} 頁", text[marker.end():end].strip()))
+        return chunks
+
+    chunks = []
+    lines = text.splitlines()
+    start = 0
+    for i in range(len(lines) + 1):
+        if i == len(lines) or not lines[i].strip():
+            paragraph = '\n'.join(lines[start:i]).strip()
+            if paragraph:
+                chunks.append((f"第 {start + 1} 行", paragraph))
+            start = i + 1
+    return chunks
+
+
+def format_timestamp(seconds):
+    """秒數轉成 時:分:秒 或 分:秒"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def index_document(path, chunks):
+    """
+    以 [(位置, 文字)] 取代索引中這個檔案的內容
+
+    位置可以是頁碼或時間戳記等任何字串，查詢結果會原樣顯示。
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    connection = _get_connection()
+    with connection:
+        connection.execute("DELETE FROM chunks WHERE path = ?", (path,))
+        connection.executemany(
+            "INSERT INTO chunks (path, location, content, tokens) VALUES (?, ?, ?, ?)",
+            [(path, location, content, tokenize(content)) for location, content in chunks if content]
+        )
+        connection.execute(
+            "INSERT OR REPLACE INTO documents (path, mtime, size) VALUES (?, ?, ?)",
+            (path, stat.st_mtime, stat.st_size)
+        )
+
+
+def index_text_file(path, force=False):
+    """索引一個文字檔，檔案沒有變動時略過；回傳是否有重新索引"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    if not force:
+        row = _get_connection().execute(
+            "SELECT mtime, size FROM documents WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == stat.st_mtime and row[1] == stat.st_size:
+            return False
+    with open(path, encoding='utf-8', errors='replace') as f:
+        index_document(path, split_pages(f.read()))
+    return True
+
+
+def index_output(path, chunks=None):
+    """
+    工具寫出結果後呼叫，更新這個檔案的索引
+
+    chunks 為 None 時從檔案內容切分；索引失敗只顯示訊息，不影響輸出。
+    """
+    try:
+        if chunks is None:
+            index_text_file(path, force=True)
+        else:
+            index_document(path, chunks)
+    except (OSError, sqlite3.Error) as e:
+        print(f"更新搜尋索引失敗: {str(e)}")
+
+
+def remove_document(path):
+    """從索引中移除檔案"""
+    path = os.path.abspath(path)
+    connection = _get_connection()
+    with connection:
+        connection.execute("DELETE FROM chunks WHERE path = ?", (path,))
+        connection.execute("DELETE FROM documents WHERE path = ?", (path,))
+
+
+def update_index(folders, recursive=True):
+    """
+    掃描資料夾中的輸出檔，只索引新增或變動的檔案，並移除已刪除的檔案
+
+    recursive 為 True 時包含子資料夾。回傳 (重新索引數, 移除數)。
+    """
+    indexed = 0
+    for folder in folders:
+        for root, dirs, files in os.walk(folder):
+            if not recursive:
+                dirs.clear()
+            for name in files:
+                if any(pattern.match(name) for pattern in INDEX_PATTERNS):
+                    try:
+                        indexed += index_text_file(os.path.join(root, name))
+                    except (OSError, UnicodeError) as e:
+                        print(f"無法索引 {name}: {str(e)}")
+
+    removed = 0
+    for (path,) in _get_connection().execute("SELECT path FROM documents").fetchall():
+        if not os.path.exists(path):
+            remove_document(path)
+            removed += 1
+    return indexed, removed
+
+
+def update_output_folders():
+    """只重新掃描 OUTPUT_FOLDERS 中存在的資料夾，回傳 (重新索引數, 移除數)"""
+    indexed = removed = 0
+    for folder, recursive in OUTPUT_FOLDERS:
+        if os.path.isdir(folder):
+            folder_indexed, folder_removed = update_index([folder], recursive)
+            indexed += folder_indexed
+            removed += folder_removed
+    return indexed, removed
+
+
+def make_snippet(content, query, width=SNIPPET_CHARS):
+    """取出第一個查詢字詞附近的文字，以【】標示"""
+    terms = CJK_RUN.findall(query) + WORD.findall(query)
+    lowered = content.lower()
+    for term in sorted(terms, key=len, reverse=True):
+        start = lowered.find(term.lower())
+        if start >= 0:
+            end = start + len(term)
+            before = content[max(0, start - width):start]
+            after = content[end:end + width]
+            prefix = '…' if start > width else ''
+            suffix = '…' if end + width < len(content) else ''
+            snippet = f"{prefix}{before}【{content[start:end]}】{after}{suffix}"
+            return ' '.join(snippet.split())
+    return ' '.join(content[:width * 2].split())
+
+
+def search(query, limit=20):
+    """全文搜尋，回傳依相關度排序的 [(檔案路徑, 位置, 摘要)]"""
+    match = build_match_query(query)
+    if not match:
+        return []
+    rows = _get_connection().execute(
+        "SELECT path, location, content FROM chunks WHERE chunks MATCH ? ORDER BY rank LIMIT ?",
+        (match, limit)
+    ).fetchall()
+    return [(path, location, make_snippet(content, query)) for path, location, content in rows]
+
+
+def print_search_results(query, limit=20):
+    """搜尋並顯示結果與耗時"""
+    start = time.perf_counter()
+    results = search(query, limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"找到 {len(results)} 筆結果（{elapsed:.1f} 毫秒）")
+    for path, location, snippet in results:
+        print(f"\n{path}  [{location}]")
+        print(f"  {snippet}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="搜尋 OCR 與轉錄輸出檔")
+    parser.add_argument('query', nargs='?', help="要搜尋的文字")
+    parser.add_argument('--update', nargs='*', metavar='資料夾',
+                        help="先更新索引（預設只掃描 picscan 資料夾與桌面上的轉錄檔）")
+    parser.add_argument('--limit', type=int, default=20, help="最多顯示幾筆")
+    args = parser.parse_args()
+
+    if args.update is not None:
+        if args.update:
+            indexed, removed = update_index([folder for folder in args.update if os.path.isdir(folder)])
+        else:
+            indexed, removed = update_output_folders()
+        print(f"索引已更新：{indexed} 個檔案重新索引，{removed} 個檔案已移除")
+
+    if args.query:
+        print_search_results(args.query, args.limit)
+
+
+if __name__ == '__main__':
+    main()
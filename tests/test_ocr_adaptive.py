@@ -0,0 +1,26 @@
+from PIL import Image
+
+from src import picscan
+
+
+def _word(line_num, conf, text):
+    return {'block_num': 1, 'par_num': 1, 'line_num': line_num, 'word_num': 1,
+            'left': 10, 'top': 10 * line_num, 'width': 50, 'height': 8, 'conf': conf, 'text': text}
+
+
+def test_low_page_confidence_without_low_lines_rereads_page(monkeypatch):
+    calls = []
+
+    def fake_ocr_words(image, lang, dpi, psm=None):
+        calls.append((dpi, psm))
+        if dpi == picscan.FAST_DPI:
+            return [_word(1, 70, '快速'), _word(2, 65, '結果')]
+        return [_word(1, 95, '精確'), _word(2, 95, '結果')]
+
+    monkeypatch.setattr(picscan, 'ocr_words', fake_ocr_words)
+    text, mode = picscan.ocr_adaptive(Image.new('L', (100, 50), 255),
+                                      lambda: Image.new('L', (200, 100), 255))
+
+    assert mode == 'page'
+    assert text == '精確\n結果'
+    assert calls == [(picscan.FAST_DPI, None), (picscan.ACCURATE_DPI, None)]
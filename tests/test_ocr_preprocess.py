@@ -0,0 +1,35 @@
+import numpy as np
+
+from src import ocr_preprocess
+
+
+def test_phone_dpi_tag_is_treated_as_unknown():
+    array = np.full((756, 1008), 255, dtype=np.uint8)
+
+    for dpi in (72, 96, 72.0):
+        resized, new_dpi = ocr_preprocess.normalize_dpi(array, dpi)
+        assert resized.shape == array.shape
+        assert new_dpi is None
+
+
+def test_upscale_is_capped():
+    array = np.full((1000, 800), 255, dtype=np.uint8)
+
+    resized, dpi = ocr_preprocess.normalize_dpi(array, 50)
+
+    assert resized.shape == (2000, 1600)
+    assert dpi == 100
+
+
+def test_binarize_matches_float_integral_image():
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 256, (600, 900), dtype=np.uint8)
+    window = 31
+    padded = np.pad(array.astype(np.float64), window // 2 + 1, mode='edge')
+    integral = padded.cumsum(axis=0).cumsum(axis=1)
+    total = (integral[window:window + 600, window:window + 900] - integral[:600, window:window + 900]
+             - integral[window:window + 600, :900] + integral[:600, :900])
+    mean = total / (window * window)
+    expected = np.where(array < mean * (1 - ocr_preprocess.BINARIZE_OFFSET), 0, 255)
+
+    assert np.array_equal(ocr_preprocess.binarize(array, 300), expected)
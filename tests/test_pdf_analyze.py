@@ -0,0 +1,137 @@
+import importlib
+import json
+import random
+import zlib
+
+from src.pdf_benchmark import text_content, write_pdf
+
+pdf_compress = importlib.import_module('src.PDF壓縮')
+
+
+def _write_text_logo_pdf(path, pages=3):
+    """每頁一段文字加一個很小的標誌影像"""
+    rng = random.Random(1)
+    logo = zlib.compress(bytes(range(16)) * 4)
+    logo_dict = "/Width 8 /Height 8 /ColorSpace /DeviceGray /BitsPerComponent 8"
+    write_pdf(path, pages, lambda index: (
+        text_content(rng) + b"\nq 40 0 0 40 500 760 cm /Logo Do Q",
+        [('Logo', logo_dict, logo)],
+    ))
+
+
+def test_text_with_small_logos_predicts_no_gain(tmp_path):
+    path = tmp_path / 'letter.pdf'
+    _write_text_logo_pdf(path)
+
+    analysis = pdf_compress.analyze_pdf(path)
+
+    assert analysis['image_count'] == 3
+    assert analysis['image_fraction'] < 0.05
+    assert analysis['predicted_gain'] < pdf_compress.MIN_PREDICTED_GAIN
+
+
+def test_empty_pdf_fails_and_is_not_cached(tmp_path):
+    source = tmp_path / 'in'
+    source.mkdir()
+    (source / 'empty.pdf').write_bytes(b'')
+    output = tmp_path / 'out'
+
+    for _ in range(2):
+        results = pdf_compress.compress_pdf_batch([source / 'empty.pdf'], output)
+        assert [(status, success) for _, status, success, *_ in results] == [('failed', False)]
+        pdf_compress.format_batch_summary(results)
+
+
+def test_target_size_settings_reach_report(tmp_path, monkeypatch):
+    source = tmp_path / 'in'
+    source.mkdir()
+    _write_text_logo_pdf(source / 'letter.pdf')
+    output = tmp_path / 'out'
+
+    def fake_to_size(input_path, output_path, target_size):
+        data = open(input_path, 'rb').read()
+        with open(output_path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        return True, 50.0, len(data), len(data) // 2, {'resolution': 120, 'jpeg_quality': 60}
+
+    monkeypatch.setattr(pdf_compress, 'compress_pdf_to_size', fake_to_size)
+    results = pdf_compress.compress_pdf_batch([source / 'letter.pdf'], output, min_gain=0,
+                                              target_size=1024)
+
+    assert results[0][1] == 'compressed'
+    assert results[0][6]['settings'] == {'resolution': 120, 'jpeg_quality': 60}
+    assert '解析度 120 DPI，JPEG 品質 60' in pdf_compress.format_batch_summary(results)
+    report = json.loads((output / pdf_compress.REPORT_NAME).read_text(encoding='utf-8'))
+    assert report['files'][0]['settings'] == {'resolution': 120, 'jpeg_quality': 60}
+
+
+def test_target_size_skips_prescan(tmp_path, monkeypatch):
+    source = tmp_path / 'in'
+    source.mkdir()
+    _write_text_logo_pdf(source / 'letter.pdf')
+    calls = []
+
+    def fake_to_size(input_path, output_path, target_size):
+        calls.append(target_size)
+        return False, "最低畫質仍無法壓縮到上限以下", 0, 0, None
+
+    monkeypatch.setattr(pdf_compress, 'compress_pdf_to_size', fake_to_size)
+    results = pdf_compress.compress_pdf_batch([source / 'letter.pdf'], tmp_path / 'out', target_size=1024)
+
+    assert calls == [1024]
+    assert [(status, success) for _, status, success, *_ in results] == [('failed', False)]
+
+
+def test_unreadable_pdf_fails_without_raising(tmp_path, monkeypatch):
+    def locked(*args, **kwargs):
+        raise PermissionError("檔案被鎖定")
+
+    monkeypatch.setattr(pdf_compress, 'copy_atomic', locked)
+    path = tmp_path / 'letter.pdf'
+    _write_text_logo_pdf(path)
+
+    # 預估效果不足時會複製原檔，複製失敗應只讓這個檔案失敗
+    status, success, result, *_ = pdf_compress.compress_pdf_checked(str(path), str(tmp_path / 'out.pdf'))
+
+    assert (status, success, result) == ('failed', False, "檔案被鎖定")
+
+
+def test_locked_file_fails_without_aborting_batch(tmp_path, monkeypatch):
+    source = tmp_path / 'in'
+    source.mkdir()
+    (source / 'locked.pdf').write_bytes(b'%PDF-1.4\n')
+    (source / 'empty.pdf').write_bytes(b'')
+    file_sha256 = pdf_compress.file_sha256
+
+    def locked_sha256(path, *args):
+        if path.name == 'locked.pdf':
+            raise PermissionError("檔案被鎖定")
+        return file_sha256(path, *args)
+
+    monkeypatch.setattr(pdf_compress, 'file_sha256', locked_sha256)
+    results = pdf_compress.compress_pdf_batch(sorted(source.iterdir()), tmp_path / 'out')
+
+    assert sorted((pdf_file.name, status) for pdf_file, status, *_ in results) == [
+        ('empty.pdf', 'failed'), ('locked.pdf', 'failed')]
+
+
+def test_over_budget_keeps_smallest_attempt(tmp_path, monkeypatch):
+    source = tmp_path / 'in'
+    source.mkdir()
+    _write_text_logo_pdf(source / 'letter.pdf')
+    output = tmp_path / 'out'
+
+    def fake_to_size(input_path, output_path, target_size):
+        data = open(input_path, 'rb').read()
+        with open(output_path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        return False, "最低畫質仍無法壓縮到上限以下", len(data), len(data) // 2, {'resolution': 72,
+                                                                              'jpeg_quality': 40}
+
+    monkeypatch.setattr(pdf_compress, 'compress_pdf_to_size', fake_to_size)
+    results = pdf_compress.compress_pdf_batch([source / 'letter.pdf'], output, target_size=16)
+
+    pdf_file, status, success, result, original_size, compressed_size, stats = results[0]
+    assert (status, success) == ('over_budget', False)
+    assert (output / 'compressed_letter.pdf').stat().st_size == compressed_size == original_size // 2
+    assert '超過大小上限' in pdf_compress.format_batch_summary(results)
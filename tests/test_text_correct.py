@@ -0,0 +1,36 @@
+import os
+
+from src import text_correct
+from src.text_correct import TextCorrector
+
+
+def test_leftmost_longest_match_wins():
+    corrector = TextCorrector({'干': '乾', '干淨': '乾淨', '淨化': '净化'})
+
+    # 「干淨」與「淨化」重疊時取最左邊的詞，之後從詞尾繼續
+    assert corrector.correct('干淨化干') == '乾淨化乾'
+
+
+def test_identity_entry_protects_longer_word():
+    corrector = TextCorrector({'干': '乾', '干擾': '干擾'})
+
+    assert corrector.correct('干擾干') == '干擾乾'
+
+
+def test_empty_mapping_returns_text_unchanged():
+    assert TextCorrector({}).correct('台灣') == '台灣'
+
+
+def test_corrections_reload_when_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / 'wrong_chars.json'
+    path.write_text('{"台灣": "臺灣"}', encoding='utf-8')
+    monkeypatch.setattr(text_correct, 'CORRECTIONS_PATH', str(path))
+    monkeypatch.setattr(text_correct, '_corrector', None)
+
+    assert text_correct.correct_text('台灣台北') == '臺灣台北'
+
+    path.write_text('{"台北": "臺北"}', encoding='utf-8')
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert text_correct.correct_text('台灣台北') == '台灣臺北'
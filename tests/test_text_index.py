@@ -0,0 +1,37 @@
+from src import text_index
+from src.text_index import build_match_query, split_pages, tokenize
+
+
+def test_tokenize_uses_bigrams_for_cjk_and_words_for_latin():
+    assert tokenize('臺灣大學 OCR Test') == '臺灣 灣大 大學 學 ocr test'
+    assert tokenize('好') == '好'
+
+
+def test_match_query_phrase_prefix_and_punctuation():
+    assert build_match_query('臺灣大學') == '"臺灣 灣大 大學"'
+    assert build_match_query('灣') == '"灣"*'
+    assert build_match_query('PDF 壓縮') == '"pdf" AND "壓縮"'
+    assert build_match_query('！？…,.') == ''
+
+
+def test_split_pages_by_marker_or_paragraph():
+    assert split_pages('=== 第 1 頁 ===\n甲\n=== 第 2 頁 ===\n乙') == [('第 1 頁', '甲'), ('第 2 頁', '乙')]
+    assert split_pages('第一段\n\n第二段\n續') == [('第 1 行', '第一段'), ('第 3 行', '第二段\n續')]
+
+
+def test_search_finds_single_and_multi_character_queries(tmp_path, monkeypatch):
+    monkeypatch.setattr(text_index, 'INDEX_PATH', str(tmp_path / 'index.sqlite'))
+    monkeypatch.setattr(text_index, '_connection', None)
+    path = tmp_path / 'output_scan.txt'
+    path.write_text('=== 第 1 頁 ===\n國立臺灣大學圖書館\n=== 第 2 頁 ===\nInvoice total', encoding='utf-8')
+
+    assert text_index.update_index([str(tmp_path)]) == (1, 0)
+    assert [location for _, location, _ in text_index.search('臺灣大學')] == ['第 1 頁']
+    assert [location for _, location, _ in text_index.search('館')] == ['第 1 頁']
+    assert [location for _, location, _ in text_index.search('INVOICE')] == ['第 2 頁']
+    assert text_index.search('灣臺') == []
+    assert text_index.search('。') == []
+
+    path.unlink()
+    assert text_index.update_index([str(tmp_path)]) == (0, 1)
+    text_index._connection.close()